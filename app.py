@@ -1,15 +1,22 @@
-from flask import Flask, render_template, request, session, jsonify, redirect, url_for
+from flask import Flask, render_template, request, session, jsonify, redirect, url_for, Response
 from flask_socketio import SocketIO, emit, join_room
+import io
 import json
+import mimetypes
 import os
 import sys
 import uuid
 
 sys.path.append(os.getcwd())
-from core.crypto_utils import hash_password, verify_password, AESCipher
-from core.paillier import SimplePaillier
+from core.cache import LRUCache
+from core.crypto_utils import PasswordHasher, AESCipher, StreamCipher, ciphertext_text
+from core.paillier import SimplePaillier, PaillierPrivateKey, PackedEncoder, KeyPool, sum_ciphertexts
 from core.stego import Steganography
+from core.wire import (negotiate_codec, encode_public_key, decode_public_key, encode_private_key, decode_private_key,
+                       encode_ciphertexts, decode_ciphertexts, encode_ciphertext, decode_ciphertext)
 from database import DatabaseManager
+from werkzeug.sansio.multipart import MultipartDecoder, NeedData, Epilogue, File, Data
+from werkzeug.utils import secure_filename
 
 app = Flask(__name__)
 app.secret_key = "SecretKeyForSession"
@@ -21,7 +28,17 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 with open('config.json', 'r') as f: CONFIG = json.load(f)
-db = DatabaseManager(CONFIG['db_path'])
+# 消息写入走组提交队列，on_send 等待消息 id 时用 socketio.sleep 让出事件循环
+db = DatabaseManager(CONFIG['db_path'], sqlite=CONFIG.get('sqlite'), group_commit=CONFIG.get('group_commit'), sleep=socketio.sleep)
+# 隐私计算演示用的 Paillier 密钥由后台进程预生成，避免素数生成阻塞 eventlet 事件循环
+key_pool = KeyPool(CONFIG.get('paillier_key_bits', 128), CONFIG.get('paillier_key_pool_size', 4),
+                   randomness=CONFIG.get('paillier_randomness_pool_size', 64))
+# 登录 / 注册的 PBKDF2 同理放到进程池，等待结果时用 socketio.sleep 让出事件循环；队列满时返回 503
+password_hasher = PasswordHasher(CONFIG.get('password_workers'), CONFIG.get('password_queue_size'), sleep=socketio.sleep)
+
+# 解密后的消息明文，按消息 id 缓存 (所有用户共用同一 AES 密钥)；room_cache_stats 为各房间的 [命中, 未命中]
+message_cache = LRUCache(CONFIG.get('message_cache_bytes', 32 * 1024 * 1024))
+room_cache_stats = {}
 
 user_keys = {}
 def init_user_keys(username):
@@ -33,6 +50,64 @@ def init_user_keys(username):
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# 上传文件按块 AES-GCM 加密落盘为 <name>.enc，经 /api/files/<name> 边读边解密 (支持 Range)；
+# static/uploads 下的旧明文文件仍按原地址访问
+file_cipher = StreamCipher(CONFIG['shared_secret'])
+
+def save_encrypted(src, name):
+    path = os.path.join(app.config['UPLOAD_FOLDER'], name + '.enc')
+    try:
+        with open(path + '.tmp', 'wb') as dst: file_cipher.encrypt_stream(src, dst)
+    except BaseException:
+        os.unlink(path + '.tmp')
+        raise
+    os.replace(path + '.tmp', path)
+
+class MultipartFileReader:
+    # 直接从 request.stream 解析 multipart，把名为 field 的文件部分当作只读流交给 encrypt_stream。
+    # request.files 会把大于 500 KB 的文件先以明文写进临时文件，这里只缓冲一个网络块，明文从不落盘
+    def __init__(self, stream, boundary, field, bufsize=64 * 1024):
+        self.stream = stream
+        self.bufsize = bufsize
+        self.decoder = MultipartDecoder(boundary.encode())
+        self.buf = bytearray()
+        self.filename = None
+        self.more = False
+        for event in self._events():
+            if isinstance(event, File) and event.name == field:
+                self.filename, self.more = event.filename or '', True
+                break
+
+    def _events(self):
+        while True:
+            event = self.decoder.next_event()
+            if isinstance(event, Epilogue): return
+            if not isinstance(event, NeedData):
+                yield event
+                continue
+            # 请求体读完后传 None；数据被截断时 next_event 随即抛 ValueError
+            self.decoder.receive_data(self.stream.read(self.bufsize) or None)
+
+    def read(self, size):
+        while self.more and len(self.buf) < size:
+            event = next(self._events(), None)
+            if not isinstance(event, Data): raise ValueError("上传数据不完整")
+            self.buf += event.data
+            self.more = event.more_data
+        out = bytes(self.buf[:size])
+        del self.buf[:size]
+        return out
+
+def load_upload(url):
+    # 读出整个上传文件 (隐写提取需要完整图片)；新文件先解密，旧文件直接打开
+    name = secure_filename(url.split('/')[-1])
+    path = os.path.join(app.config['UPLOAD_FOLDER'], name)
+    if not os.path.exists(path + '.enc'): return path
+    buf = io.BytesIO()
+    with open(path + '.enc', 'rb') as f: file_cipher.decrypt_stream(f, buf)
+    buf.seek(0)
+    return buf
+
 @app.route('/')
 def index(): return redirect(url_for('chat')) if 'username' in session else render_template('login.html')
 
@@ -46,80 +121,196 @@ def stego_hide():
     file = request.files['image']
     text = request.form.get('text', '')
     unique = "stego_" + str(uuid.uuid4()) + ".png"
-    path = os.path.join(app.config['UPLOAD_FOLDER'], unique)
-    file.save(path + ".tmp")
-    
+    # 隐写结果写在内存里，加密后才落盘，磁盘上不留明文图片
+    out = io.BytesIO()
     stego = Steganography()
-    if stego.hide(path + ".tmp", text, path):
-        os.remove(path + ".tmp")
-        return jsonify({'status': 'ok', 'url': f'/static/uploads/{unique}', 'msg_type': 'image', 'file_name': 'secret.png'})
+    if stego.hide(file.stream, text, out):
+        out.seek(0)
+        save_encrypted(out, unique)
+        return jsonify({'status': 'ok', 'url': f'/api/files/{unique}', 'msg_type': 'image', 'file_name': 'secret.png'})
     return jsonify({'status': 'error'})
 
 @app.route('/api/stego_extract', methods=['POST'])
 def stego_extract():
     url = request.json.get('url')
     if not url: return jsonify({'status':'error'})
-    path = os.path.join(app.config['UPLOAD_FOLDER'], url.split('/')[-1])
-    return jsonify({'status': 'ok', 'text': Steganography().extract(path)})
+    try: image = load_upload(url)
+    except ValueError: return jsonify({'status':'error'})
+    return jsonify({'status': 'ok', 'text': Steganography().extract(image)})
 
 # === 2. 隐私计算 ===
 @app.route('/api/client_mock_encrypt', methods=['POST'])
 def client_mock_encrypt():
-    values = request.json.get('values')
+    try: values = [int(v) for v in request.json.get('values')]
+    except (TypeError, ValueError): return jsonify({'status': 'error', 'msg': '数值必须为整数'}), 400
+    codec = negotiate_codec(request.json.get('codecs'))
     pai = SimplePaillier()
-    pub, priv = pai.generate_keys(128)
-    return jsonify({'status': 'ok', 'public_key': pub, 'private_key': priv, 'ciphertexts': [pai.encrypt(pub, int(v)) for v in values]})
+    # 密钥与其随机数池一起预先备好，这里只取用已算好的 r^n
+    pub, priv, pool = key_pool.take(with_pool=True)
+    resp = {'status': 'ok', 'codec': codec}
+    # packed=true 时多个小整数打包进同一个明文，密文数量降为 1/k
+    encoder = PackedEncoder(pub) if request.json.get('packed') else None
+    # 槽位只容纳 [0, 2^value_bits) 的值；有值越界时退回逐个加密 (响应不带 packing，解密端不拆槽)
+    if encoder and not all(0 <= v < (1 << encoder.value_bits) for v in values): encoder = None
+    plaintexts = encoder.pack(values) if encoder else values
+    ciphertexts = [pai.encrypt(pub, m, pool=pool) for m in plaintexts]
+    # paillier_randomness_pool_size 为 0 时不建随机数池，pool 为 None
+    if pool is not None: pool.close()
+    if codec: resp.update(public_key=encode_public_key(pub), private_key=encode_private_key(pub, priv), ciphertexts=encode_ciphertexts(pub, ciphertexts))
+    else: resp.update(public_key=pub, private_key=priv, ciphertexts=ciphertexts)
+    if encoder: resp['packing'] = {'value_bits': encoder.value_bits, 'additions': encoder.additions, 'count': len(values)}
+    if pool is not None: resp['pool'] = pool.stats()
+    resp['key_pool'] = key_pool.stats()
+    return jsonify(resp)
 
 @app.route('/api/privacy_calc', methods=['POST'])
 def privacy_calc():
-    pub = request.json.get('public_key')
-    ciphers = request.json.get('ciphertexts')
-    n_sq = int(pub['n']) ** 2
-    res = 1
-    for c in ciphers: res = (res * int(c)) % n_sq
-    return jsonify({'status': 'ok', 'encrypted_sum': str(res)})
+    codec = negotiate_codec(request.json.get('codecs'))
+    pub = decode_public_key(request.json.get('public_key'))
+    enc_sum = sum_ciphertexts(pub, decode_ciphertexts(pub, request.json.get('ciphertexts')))
+    return jsonify({'status': 'ok', 'codec': codec, 'encrypted_sum': encode_ciphertext(pub, enc_sum) if codec else str(enc_sum)})
 
 @app.route('/api/client_mock_decrypt', methods=['POST'])
 def client_mock_decrypt():
-    pub = request.json.get('public_key')
-    priv = request.json.get('private_key')
-    c = request.json.get('encrypted_sum')
-    return jsonify({'result': SimplePaillier().decrypt(pub, priv, c)})
+    pub = decode_public_key(request.json.get('public_key'))
+    priv = decode_private_key(pub, request.json.get('private_key'))
+    c = decode_ciphertext(pub, request.json.get('encrypted_sum'))
+    packing = request.json.get('packing')
+    m = priv.decrypt(c) if isinstance(priv, PaillierPrivateKey) else SimplePaillier.decrypt(priv, pub, c)
+    # 打包密文求和后每个槽位是该槽的部分和，总和为所有槽位之和
+    if packing: m = sum(PackedEncoder(pub, packing['value_bits'], packing['additions']).unpack(m))
+    return jsonify({'result': m})
+
+def decrypt_messages(keys, room, rows):
+    # 先查明文缓存，未命中的整批 decrypt_many 后回填；失败的位置是异常对象
+    plains = [message_cache.get(msg['id']) for msg in rows]
+    missing = [i for i, pt in enumerate(plains) if pt is None]
+    stats = room_cache_stats.setdefault(room, [0, 0])
+    stats[0] += len(rows) - len(missing)
+    stats[1] += len(missing)
+    for i, pt in zip(missing, keys['aes'].decrypt_many(rows[i]['content_enc'] for i in missing)):
+        plains[i] = pt
+        if not isinstance(pt, Exception): message_cache.put(rows[i]['id'], pt)
+    return plains
 
 # === 3. SSE 搜索 ===
+def decrypt_results(keys, room, rows):
+    plains = decrypt_messages(keys, room, rows)
+    return [{**msg, "content_enc": ciphertext_text(msg['content_enc']), "content": pt, "is_encrypted": False}
+            for msg, pt in zip(rows, plains) if not isinstance(pt, Exception)]
+
+# 搜索游标: 上一页最后一条的 "timestamp:id"，翻页只看 id (见 DatabaseManager.search_encrypted)
+def format_cursor(before):
+    return f"{before[0]!r}:{before[1]}" if before else None
+
+def parse_cursor(cursor):
+    if not cursor: return None
+    ts, mid = str(cursor).rsplit(':', 1)
+    return (float(ts), int(mid))
+
 @app.route('/api/search_sse', methods=['POST'])
 def search_sse():
-    if 'username' not in session: return jsonify([])
-    trapdoor = request.json.get('trapdoor')
-    room = "_".join(sorted([session['username'], request.json.get('target')]))
-    results = db.search_encrypted(trapdoor, room)
-    
+    if 'username' not in session: return jsonify({"results": [], "next_cursor": None})
+    data = request.json
+    # trapdoors + mode ('and' / 'or') 为多关键词检索，单个 trapdoor 仍然可用
+    trapdoors = data.get('trapdoors') or [data.get('trapdoor')]
+    mode = data.get('mode', 'and')
+    room = "_".join(sorted([session['username'], data.get('target')]))
+    try: limit = max(1, min(int(data.get('limit') or CONFIG.get('search_page_size', 50)), 500))
+    except (TypeError, ValueError): return jsonify({"status": "error", "msg": "无效的 limit"}), 400
+    try: before = parse_cursor(data.get('cursor'))
+    except ValueError: return jsonify({"status": "error", "msg": "无效的游标"}), 400
     keys = init_user_keys(session['username'])
-    decrypted = []
-    for msg in results:
-        try:
-            pt = keys['aes'].decrypt(msg['content_enc'])
-            decrypted.append({**msg, "content": pt, "is_encrypted": False})
-        except: pass
-    return jsonify(decrypted)
+
+    def page(before):
+        rows = db.search_encrypted(trapdoors, room, mode, limit=limit, before=before)
+        return decrypt_results(keys, room, rows), ((rows[-1]['timestamp'], rows[-1]['id']) if len(rows) == limit else None)
+
+    if not data.get('stream'):
+        results, before = page(before)
+        return jsonify({"results": results, "next_cursor": format_cursor(before)})
+
+    # 流式: NDJSON 每行一条结果，按页取库、解密后立即写出，最后一行为 {"done": true}
+    def generate(before):
+        while True:
+            results, before = page(before)
+            for r in results: yield json.dumps(r, ensure_ascii=False) + "\n"
+            if not before: break
+        yield json.dumps({"done": True}) + "\n"
+    return Response(generate(before), mimetype='application/x-ndjson')
+
+@app.route('/api/search_stats')
+def search_stats():
+    # 布隆过滤器与倒排表 LRU 的命中 / 淘汰计数
+    if 'username' not in session: return jsonify({})
+    return jsonify({"bloom": db.bloom_stats(), "cache": dict(db.search_cache.stats(), oversized=len(db.search_oversized))})
+
+@app.route('/api/db_stats')
+def db_stats():
+    # 连接池与组提交队列 (批数、平均批大小、当前排队数)
+    if 'username' not in session: return jsonify({})
+    return jsonify({"pool": db.pool.stats(), "writes": db.write_stats()})
+
+@app.route('/api/cache_stats')
+def cache_stats():
+    # 明文缓存总体统计 + 当前用户各会话房间的命中率
+    if 'username' not in session: return jsonify({})
+    me = session['username']
+    rooms = {}
+    for friend in db.get_friends(me):
+        room = "_".join(sorted([me, friend]))
+        hits, misses = room_cache_stats.get(room, (0, 0))
+        rooms[friend] = {"hits": hits, "misses": misses, "hit_ratio": hits / (hits + misses) if hits + misses else 0.0}
+    return jsonify({"messages": message_cache.stats(), "rooms": rooms})
 
 # === 基础功能 ===
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
-    if 'file' not in request.files: return jsonify({'status': 'error'})
-    file = request.files['file']
-    if file and allowed_file(file.filename):
+    boundary = request.mimetype_params.get('boundary')
+    if request.mimetype != 'multipart/form-data' or not boundary: return jsonify({'status': 'error'})
+    try:
+        file = MultipartFileReader(request.stream, boundary, 'file')
+        if not file.filename or not allowed_file(file.filename): return jsonify({'status': 'error'})
         ext = file.filename.rsplit('.', 1)[1].lower()
         unique = str(uuid.uuid4()) + "." + ext
-        file.save(os.path.join(app.config['UPLOAD_FOLDER'], unique))
-        return jsonify({'status': 'ok', 'url': f'/static/uploads/{unique}', 'msg_type': 'image' if ext in ['png','jpg','jpeg','gif'] else 'file', 'original_name': file.filename})
-    return jsonify({'status': 'error'})
+        save_encrypted(file, unique)
+    except ValueError: return jsonify({'status': 'error'})
+    return jsonify({'status': 'ok', 'url': f'/api/files/{unique}', 'msg_type': 'image' if ext in ['png','jpg','jpeg','gif'] else 'file', 'original_name': file.filename})
+
+@app.route('/api/files/<name>')
+def serve_file(name):
+    if 'username' not in session: return Response(status=403)
+    path = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(name) + '.enc')
+    if not os.path.exists(path): return Response(status=404)
+    f = open(path, 'rb')
+    try: size = file_cipher.plaintext_size(f)
+    except ValueError:
+        f.close()
+        return Response(status=500)
+    start, stop, status = 0, size, 200
+    headers = {'Accept-Ranges': 'bytes'}
+    # 只支持单区间；只解密区间涉及的块
+    if request.range and len(request.range.ranges) == 1:
+        rng = request.range.range_for_length(size)
+        if rng is None:
+            f.close()
+            return Response(status=416, headers={'Content-Range': f'bytes */{size}'})
+        (start, stop), status = rng, 206
+        headers['Content-Range'] = f'bytes {start}-{stop - 1}/{size}'
+    headers['Content-Length'] = str(stop - start)
+
+    # 文件在响应关闭时释放，即使客户端断开、生成器从未开始迭代
+    resp = Response(file_cipher.decrypt_range(f, start, stop), status=status, headers=headers, mimetype=mimetypes.guess_type(name)[0] or 'application/octet-stream')
+    resp.call_on_close(f.close)
+    return resp
 
 @app.route('/api/login', methods=['POST'])
 def login():
     data = request.json
     creds = db.get_user_credentials(data.get('username'))
-    if creds and verify_password(creds[0], creds[1], data.get('password')):
+    ok = password_hasher.verify(creds[0], creds[1], data.get('password')) if creds else False
+    if ok is None: return server_busy()
+    if ok:
         session['username'] = data.get('username')
         init_user_keys(data.get('username'))
         return jsonify({"status": "ok"})
@@ -127,10 +318,21 @@ def login():
 
 @app.route('/api/register', methods=['POST'])
 def register():
-    key, salt = hash_password(request.json.get('password'))
+    hashed = password_hasher.hash(request.json.get('password'))
+    if hashed is None: return server_busy()
+    key, salt = hashed
     if db.register_user(request.json.get('username'), key, salt): return jsonify({"status": "ok"})
     return jsonify({"status": "error", "msg": "Exists"})
 
+def server_busy():
+    return jsonify({"status": "error", "msg": "服务器繁忙，请稍后重试"}), 503, {"Retry-After": "1"}
+
+@app.route('/api/auth_stats')
+def auth_stats():
+    # 密码哈希进程池的队列深度、拒绝数与延迟
+    if 'username' not in session: return jsonify({})
+    return jsonify(password_hasher.stats())
+
 @app.route('/api/logout', methods=['POST'])
 def logout(): session.pop('username', None); return jsonify({"status": "ok"})
 
@@ -173,12 +375,13 @@ def on_join(data):
     join_room(room)
     
     keys = init_user_keys(me)
+    history = db.get_room_history(room)
     decrypted = []
-    for msg in db.get_room_history(room):
-        try:
-            pt = keys['aes'].decrypt(msg['content_enc'])
-            decrypted.append({**msg, "content": pt, "is_encrypted": False})
-        except: decrypted.append({**msg, "content": "[Fail]", "is_encrypted": True})
+    for msg, pt in zip(history, decrypt_messages(keys, room, history)):
+        # 库里是 BLOB，发给前端时才转成 base64
+        msg = {**msg, "content_enc": ciphertext_text(msg['content_enc'])}
+        if isinstance(pt, Exception): decrypted.append({**msg, "content": "[Fail]", "is_encrypted": True})
+        else: decrypted.append({**msg, "content": pt, "is_encrypted": False})
     emit('history_messages', decrypted)
 
 @socketio.on('send_message')
@@ -187,11 +390,10 @@ def on_send(data):
     room = "_".join(sorted([sender, data['target']]))
     keys = init_user_keys(sender)
     
-    enc_content = keys['aes'].encrypt(data['content'])
-    msg_id = db.store_message(room, sender, enc_content, data.get('msg_type','text'), data.get('file_name'))
-    
-    if data.get('msg_type') == 'text' and data.get('search_indexes'):
-        db.add_search_index(msg_id, data['search_indexes'])
+    enc_content = keys['aes'].encrypt_bytes(data['content'])
+    trapdoors = data.get('search_indexes') if data.get('msg_type') == 'text' else None
+    msg_id = db.store_message(room, sender, enc_content, data.get('msg_type','text'), data.get('file_name'), trapdoors)
+    message_cache.put(msg_id, str(data['content']))
     
     emit('new_message', {
         "id": msg_id, "sender": sender, "content": data['content'],
@@ -200,4 +402,6 @@ def on_send(data):
     }, room=room)
 
 if __name__ == '__main__':
+    key_pool.start()
+    password_hasher.start()
     socketio.run(app, host='0.0.0.0', port=9999, debug=False, allow_unsafe_werkzeug=True)
\ No newline at end of file
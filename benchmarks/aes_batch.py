@@ -0,0 +1,50 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.crypto_utils import AESCipher
+
+# 聊天记录批量解密: 逐条 AESCipher.decrypt 对比 decrypt_many (单线程 / 线程池)
+# 运行: python -m benchmarks.aes_batch [--messages 10000] [--size 120] [--workers 4]
+
+def best_of(fn, rounds):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=10000)
+    parser.add_argument('--size', type=int, default=120, help="每条消息的明文字节数")
+    parser.add_argument('--workers', type=int, default=0, help="线程数，0 表示 CPU 数")
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    aes = AESCipher("BenchmarkSecret")
+    plain = ["x" * args.size] * args.messages
+    encs = aes.encrypt_many(plain)
+    workers = args.workers or os.cpu_count()
+    assert aes.decrypt_many(encs, workers=workers) == plain
+
+    print(f"messages={args.messages}, size={args.size}B, workers={workers}")
+    print(f"{'case':<24}{'total (ms)':>12}{'us/msg':>10}{'speedup':>10}")
+    base = None
+    for name, fn in (('decrypt loop', lambda: [aes.decrypt(e) for e in encs]),
+                     ('decrypt_many serial', lambda: aes.decrypt_many(encs, workers=1)),
+                     ('decrypt_many pool', lambda: aes.decrypt_many(encs, workers=workers)),
+                     ('encrypt loop', lambda: [aes.encrypt(p) for p in plain]),
+                     ('encrypt_many serial', lambda: aes.encrypt_many(plain, workers=1)),
+                     ('encrypt_many pool', lambda: aes.encrypt_many(plain, workers=workers))):
+        elapsed = best_of(fn, args.rounds)
+        if name.endswith('loop'): base = elapsed
+        print(f"{name:<24}{elapsed * 1000:>12.1f}{elapsed * 1e6 / args.messages:>10.2f}{base / elapsed:>9.1f}x")
+
+if __name__ == '__main__':
+    main()
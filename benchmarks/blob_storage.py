@@ -0,0 +1,66 @@
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.crypto_utils import AESCipher
+from database import DatabaseManager
+
+# messages.content_enc: base64 文本 (旧格式) 迁移为 BLOB 前后的库大小与历史记录加载延迟
+# 运行: python -m benchmarks.blob_storage [--messages 200000] [--rooms 50] [--size 120]
+
+def history_latency(db, aes, rooms, queries):
+    rnd = random.Random(7)
+    samples = []
+    for _ in range(queries):
+        room = f"room{rnd.randrange(rooms)}"
+        start = time.perf_counter()
+        cur = db.conn.execute("SELECT id, content_enc FROM messages WHERE room=? ORDER BY timestamp DESC LIMIT 1000", (room,))
+        aes.decrypt_many(r[1] for r in cur.fetchall())
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--rooms', type=int, default=50)
+    parser.add_argument('--size', type=int, default=120, help="每条消息的明文字节数")
+    parser.add_argument('--queries', type=int, default=50)
+    args = parser.parse_args()
+
+    aes = AESCipher("BenchmarkSecret")
+    folder = tempfile.mkdtemp()
+    try:
+        db = DatabaseManager(os.path.join(folder, 'x.db'), migrate=False)
+        path = os.path.join(folder, 'secure_chat_final.db')
+        # 直接按旧格式 (base64 文本) 写入
+        rnd = random.Random(42)
+        encs = aes.encrypt_many(("x" * args.size for _ in range(args.messages)))
+        db.conn.executemany("INSERT INTO messages (room, sender, content_enc, msg_type, timestamp) VALUES (?, 'u', ?, 'text', ?)",
+                            ((f"room{rnd.randrange(args.rooms)}", enc, float(i)) for i, enc in enumerate(encs)))
+        db.conn.commit()
+        db.conn.execute("VACUUM")
+        db.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+        print(f"messages={args.messages}, size={args.size}B, history=1000 msgs/room")
+        print(f"{'storage':>10}{'db (MB)':>10}{'history p50 (ms)':>18}")
+        print(f"{'base64':>10}{os.path.getsize(path) / 1e6:>10.1f}{history_latency(db, aes, args.rooms, args.queries):>18.2f}")
+        start = time.perf_counter()
+        converted = db.migrate_content_blobs(batch=2000, pause=0)
+        elapsed = time.perf_counter() - start
+        db.conn.execute("VACUUM")
+        db.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        print(f"{'blob':>10}{os.path.getsize(path) / 1e6:>10.1f}{history_latency(db, aes, args.rooms, args.queries):>18.2f}")
+        print(f"\nmigrated {converted} rows in {elapsed:.1f}s ({converted / elapsed:.0f} rows/s)")
+        db.close()
+    finally:
+        shutil.rmtree(folder)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.crypto_utils import AESCipher, hash_password
+from core.paillier import SimplePaillier
+from core.sse_utils import generate_trapdoor
+
+# core/ 密码学原语微基准: 报告 ops/sec 与 p50/p99 延迟，支持保存基线与回归比较
+#   python -m benchmarks.crypto_bench                       # 表格输出
+#   python -m benchmarks.crypto_bench --json                # JSON 输出
+#   python -m benchmarks.crypto_bench --save-baseline       # 写入 benchmarks/baseline.json
+#   python -m benchmarks.crypto_bench --compare             # 与基线比较，p50 变慢超过阈值则退出码为 1
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def measure(fn, min_time=0.5, min_rounds=5, max_rounds=10000):
+    fn()  # 预热
+    samples = []
+    deadline = time.perf_counter() + min_time
+    while len(samples) < max_rounds and (len(samples) < min_rounds or time.perf_counter() < deadline):
+        start = time.perf_counter_ns()
+        fn()
+        samples.append(time.perf_counter_ns() - start)
+    samples.sort()
+    total = sum(samples)
+    return {
+        "rounds": len(samples),
+        "ops_per_sec": len(samples) * 1e9 / total if total else 0.0,
+        "p50_us": samples[len(samples) // 2] / 1000,
+        "p99_us": samples[min(len(samples) - 1, int(len(samples) * 0.99))] / 1000,
+    }
+
+
+def decrypt_legacy(priv, pub, c):
+    # 升级前的 λ/μ 解密: 模 n^2 的全长幂运算。不经 SimplePaillier.decrypt，
+    # 因为 PaillierPrivateKey.load 会把 (lmb, mu) 元组升级成 CRT 私钥
+    lmb, mu = priv
+    n = pub[0]
+    n_sq = n * n
+    return (pow(c, lmb, n_sq) - 1) // n * mu % n
+
+
+def cases(key_bits, payload_sizes):
+    for bits in key_bits:
+        pai = SimplePaillier()
+        pub, priv = pai.generate_keys(bits)
+        legacy = (priv[0], priv[1])
+        m = random.getrandbits(32)
+        c1, c2 = pai.encrypt(pub, m), pai.encrypt(pub, m + 1)
+        assert decrypt_legacy(legacy, pub, c1) == m
+        yield f"paillier.keygen[{bits}]", lambda bits=bits: SimplePaillier().generate_keys(bits)
+        yield f"paillier.encrypt[{bits}]", lambda pub=pub, m=m: SimplePaillier.encrypt(pub, m)
+        yield f"paillier.decrypt[{bits}]", lambda pub=pub, priv=priv, c=c1: SimplePaillier.decrypt(priv, pub, c)
+        yield f"paillier.decrypt_legacy[{bits}]", lambda pub=pub, priv=legacy, c=c1: decrypt_legacy(priv, pub, c)
+        yield f"paillier.add[{bits}]", lambda pub=pub, a=c1, b=c2: SimplePaillier.add(pub, a, b)
+
+    aes = AESCipher("BenchmarkSecret")
+    for size in payload_sizes:
+        payload = "x" * size
+        enc = aes.encrypt(payload)
+        yield f"aes.encrypt[{size}B]", lambda p=payload: aes.encrypt(p)
+        yield f"aes.decrypt[{size}B]", lambda e=enc: aes.decrypt(e)
+
+    salt = os.urandom(16)
+    yield "hash_password", lambda: hash_password("correct horse battery staple", salt)
+    yield "generate_trapdoor", lambda: generate_trapdoor("keyword")
+
+
+def run(key_bits, payload_sizes, min_time):
+    results = {}
+    for name, fn in cases(key_bits, payload_sizes):
+        # 秒级的 keygen 只跑最少轮数
+        results[name] = measure(fn, min_time=min_time, min_rounds=3 if 'keygen' in name else 5)
+    return {
+        "meta": {"python": platform.python_version(), "machine": platform.machine(), "platform": platform.platform()},
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold):
+    rows = []
+    for name, cur in current["results"].items():
+        base = baseline["results"].get(name)
+        if not base: continue
+        ratio = cur["p50_us"] / base["p50_us"] if base["p50_us"] else 1.0
+        status = "SLOWER" if ratio > 1 + threshold else ("FASTER" if ratio < 1 - threshold else "ok")
+        rows.append((name, base["p50_us"], cur["p50_us"], ratio, status))
+    return rows
+
+
+def print_table(report):
+    print(f"{'case':<30}{'rounds':>8}{'ops/sec':>14}{'p50 (us)':>14}{'p99 (us)':>14}")
+    for name, r in report["results"].items():
+        print(f"{name:<30}{r['rounds']:>8}{r['ops_per_sec']:>14.1f}{r['p50_us']:>14.1f}{r['p99_us']:>14.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bits', type=int, nargs='+', default=[1024, 2048])
+    parser.add_argument('--payloads', type=int, nargs='+', default=[64, 1024, 16384, 262144])
+    parser.add_argument('--min-time', type=float, default=0.5, help="每个用例至少运行的秒数")
+    parser.add_argument('--json', action='store_true', help="输出 JSON 而不是表格")
+    parser.add_argument('--save-baseline', nargs='?', const=BASELINE_PATH, help="把结果写入基线文件")
+    parser.add_argument('--compare', nargs='?', const=BASELINE_PATH, help="与基线文件比较")
+    parser.add_argument('--threshold', type=float, default=0.2, help="p50 相对变化超过该比例视为回归")
+    args = parser.parse_args()
+
+    report = run(args.bits, args.payloads, args.min_time)
+    if args.json: print(json.dumps(report, indent=2))
+    else: print_table(report)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f: json.dump(report, f, indent=2)
+        print(f"[BENCH] 基线已写入 {args.save_baseline}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, 'r') as f: baseline = json.load(f)
+        rows = compare(report, baseline, args.threshold)
+        print(f"\n{'case':<30}{'base p50':>12}{'now p50':>12}{'ratio':>8}  status", file=sys.stderr)
+        for name, base, cur, ratio, status in rows:
+            print(f"{name:<30}{base:>12.1f}{cur:>12.1f}{ratio:>8.2f}  {status}", file=sys.stderr)
+        if any(r[4] == "SLOWER" for r in rows): sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
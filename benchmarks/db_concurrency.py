@@ -0,0 +1,110 @@
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager
+
+# 读写并发: 旧版单连接 (回滚日志，所有线程共用、需整体加锁才安全) 对比 ConnectionPool (WAL，一写多读)。
+# 一个线程持续写消息，若干线程持续拉取房间历史，报告读延迟与读写吞吐
+# 运行: python -m benchmarks.db_concurrency [--readers 4] [--seconds 5] [--messages 20000]
+
+HISTORY_SQL = "SELECT id, sender, content_enc, msg_type, file_name, timestamp FROM messages WHERE room=? ORDER BY timestamp ASC LIMIT 100"
+INSERT_SQL = "INSERT INTO messages (room, sender, content_enc, msg_type, file_name, timestamp) VALUES (?, 'u', ?, 'text', NULL, ?)"
+
+class SharedConnection:
+    # 旧版行为: 一个 check_same_thread=False 的连接 + 一把全局锁，每次写入单独提交
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=DELETE")
+        self.lock = threading.Lock()
+
+    def get_room_history(self, room):
+        with self.lock: return self.conn.execute(HISTORY_SQL, (room,)).fetchall()
+
+    def store_message(self, room, content):
+        with self.lock:
+            self.conn.execute(INSERT_SQL, (room, content, time.time()))
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+class PooledConnection:
+    def __init__(self, path, readers):
+        self.db = DatabaseManager(path, migrate=False, sqlite={"readers": readers})
+
+    def get_room_history(self, room):
+        return self.db.get_room_history(room)
+
+    def store_message(self, room, content):
+        self.db.store_message(room, 'u', content)
+
+    def close(self):
+        self.db.close()
+
+def seed(path, messages, rooms):
+    db = DatabaseManager(os.path.join(os.path.dirname(path), 'x.db'), migrate=False)
+    rnd = random.Random(42)
+    db.conn.executemany(INSERT_SQL, ((f"room{rnd.randrange(rooms)}", os.urandom(64), float(i)) for i in range(messages)))
+    db.conn.commit()
+    db.close()
+
+def run(store, readers, seconds, rooms):
+    stop = threading.Event()
+    latencies, writes = [], [0]
+
+    def reader(k):
+        rnd = random.Random(k)
+        samples = []
+        while not stop.is_set():
+            start = time.perf_counter()
+            store.get_room_history(f"room{rnd.randrange(rooms)}")
+            samples.append((time.perf_counter() - start) * 1000)
+        latencies.extend(samples)
+
+    def writer():
+        rnd = random.Random(99)
+        while not stop.is_set():
+            store.store_message(f"room{rnd.randrange(rooms)}", os.urandom(64))
+            writes[0] += 1
+
+    threads = [threading.Thread(target=reader, args=(k,)) for k in range(readers)] + [threading.Thread(target=writer)]
+    for t in threads: t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads: t.join()
+    latencies.sort()
+    return len(latencies) / seconds, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)], writes[0] / seconds
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--rooms', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"messages={args.messages}, reader threads={args.readers}, 1 writer thread")
+    print(f"{'mode':>8}{'reads/s':>10}{'read p50 (ms)':>15}{'read p99 (ms)':>15}{'writes/s':>10}")
+    for name in ('shared', 'pool'):
+        folder = tempfile.mkdtemp()
+        try:
+            path = os.path.join(folder, 'secure_chat_final.db')
+            seed(path, args.messages, args.rooms)
+            store = SharedConnection(path) if name == 'shared' else PooledConnection(path, args.readers)
+            reads, p50, p99, writes = run(store, args.readers, args.seconds, args.rooms)
+            store.close()
+            print(f"{name:>8}{reads:>10.0f}{p50:>15.3f}{p99:>15.3f}{writes:>10.0f}")
+        finally:
+            shutil.rmtree(folder)
+
+if __name__ == '__main__':
+    main()
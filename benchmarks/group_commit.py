@@ -0,0 +1,64 @@
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager
+
+# store_message 吞吐: 每条消息单独提交 (max_batch=0) 对比组提交写队列，1 / 10 / 100 个并发发送线程。
+# 每条消息带 --per-message 个陷门，报告消息/秒、单条延迟与平均批大小
+# 运行: python -m benchmarks.group_commit [--messages 5000] [--senders 1 10 100] [--synchronous NORMAL]
+
+def run(group_commit, senders, messages, per_message, synchronous):
+    folder = tempfile.mkdtemp()
+    try:
+        db = DatabaseManager(os.path.join(folder, 'x.db'), migrate=False, group_commit=group_commit)
+        db.conn.execute(f"PRAGMA synchronous={synchronous}")
+        content = os.urandom(64)
+        per_sender = messages // senders
+        latencies = []
+
+        def sender(k):
+            samples = []
+            for i in range(per_sender):
+                tds = [hashlib.sha256(f"{k}:{i}:{j}".encode()).hexdigest() for j in range(per_message)]
+                start = time.perf_counter()
+                db.store_message(f"room{k % 50}", f"user{k}", content, trapdoors=tds)
+                samples.append((time.perf_counter() - start) * 1000)
+            latencies.extend(samples)
+
+        threads = [threading.Thread(target=sender, args=(k,)) for k in range(senders)]
+        start = time.perf_counter()
+        for t in threads: t.start()
+        for t in threads: t.join()
+        elapsed = time.perf_counter() - start
+        stats = db.write_stats()
+        db.close()
+        latencies.sort()
+        return len(latencies) / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)], stats["avg_batch"] if stats["group_commit"] else 1.0
+    finally:
+        shutil.rmtree(folder)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--senders', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--per-message', type=int, default=8)
+    parser.add_argument('--synchronous', default='NORMAL', help="写连接的 PRAGMA synchronous (NORMAL / FULL)")
+    args = parser.parse_args()
+
+    print(f"messages={args.messages}, trapdoors/msg={args.per_message}, synchronous={args.synchronous}")
+    print(f"{'senders':>8}{'mode':>8}{'msgs/s':>10}{'p50 (ms)':>10}{'p99 (ms)':>10}{'avg batch':>11}")
+    for senders in args.senders:
+        for name, group_commit in (('single', {"max_batch": 0}), ('group', None)):
+            rate, p50, p99, batch = run(group_commit, senders, args.messages, args.per_message, args.synchronous)
+            print(f"{senders:>8}{name:>8}{rate:>10.0f}{p50:>10.3f}{p99:>10.3f}{batch:>11.1f}")
+
+if __name__ == '__main__':
+    main()
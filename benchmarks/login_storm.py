@@ -0,0 +1,66 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import eventlet
+
+from core.crypto_utils import PasswordHasher, hash_password, verify_password
+
+# eventlet 下的登录风暴: 同时到达 N 个登录，对比在事件循环里直接算 PBKDF2 与交给 PasswordHasher 进程池。
+# 另起一个每 5ms 醒一次的协程模拟消息投递，报告其最大停顿 (事件循环被卡住的时间) 与被受理登录的延迟
+# 运行: python -m benchmarks.login_storm [--logins 64] [--workers 4] [--queue 32]
+
+def storm(verify, logins, key, salt):
+    gaps, latencies, results = [], [], []
+    running = [True]
+
+    def ticker():
+        last = time.perf_counter()
+        while running[0]:
+            eventlet.sleep(0.005)
+            now = time.perf_counter()
+            gaps.append((now - last) * 1000 - 5)
+            last = now
+
+    def login():
+        start = time.perf_counter()
+        ok = verify(key, salt, "password")
+        results.append(ok)
+        if ok is not None: latencies.append((time.perf_counter() - start) * 1000)
+
+    tick = eventlet.spawn(ticker)
+    eventlet.sleep(0.02)
+    start = time.perf_counter()
+    pool = eventlet.GreenPool(logins)
+    for _ in range(logins): pool.spawn(login)
+    pool.waitall()
+    elapsed = time.perf_counter() - start
+    running[0] = False
+    tick.wait()
+    latencies.sort()
+    return max(gaps), latencies[len(latencies) // 2], results.count(True), results.count(None), elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--logins', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--queue', type=int, default=32, help="进程池允许的最大排队 + 计算中任务数")
+    args = parser.parse_args()
+
+    key, salt = hash_password("password")
+    hasher = PasswordHasher(args.workers, args.queue, sleep=eventlet.sleep).start()
+    hasher.verify(key, salt, "password")  # 预热，派生工作进程
+
+    print(f"logins={args.logins}, workers={args.workers}, queue={args.queue}")
+    print(f"{'mode':>8}{'max stall (ms)':>16}{'login p50 (ms)':>16}{'ok':>6}{'busy':>6}{'wall (s)':>10}")
+    for name, verify in (('inline', verify_password), ('pool', hasher.verify)):
+        stall, p50, ok, busy, elapsed = storm(verify, args.logins, key, salt)
+        print(f"{name:>8}{stall:>16.1f}{p50:>16.1f}{ok:>6}{busy:>6}{elapsed:>10.2f}")
+    print(f"\npool stats: {hasher.stats()}")
+    hasher.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import argparse
+import hashlib
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server.data_store import PostingIndex, MessageStore
+
+# chat_server 内存索引: 旧版 dict[str, list[int]] + list[dict] 对比 PostingIndex + MessageStore，
+# 报告每个关键词出现位置 (posting) 的内存与 AND 查询延迟
+# 运行: python -m benchmarks.memory_index [--messages 200000] [--per-message 8] [--vocab 50000]
+
+def workload(messages, per_message, vocab, users):
+    rnd = random.Random(42)
+    names = [f"user{i}" for i in range(users)]
+    words = [hashlib.sha256(f"w{i}".encode()).hexdigest() for i in range(vocab)]
+    for _ in range(messages):
+        # Zipf 风格的词频: 少数高频词 + 长尾
+        tds = {words[min(vocab - 1, int(rnd.paretovariate(1.1)) - 1)] for _ in range(per_message)}
+        yield rnd.choice(names), rnd.choice(names), "x" * 88, list(tds)
+
+def build_legacy(items):
+    message_store, search_index = [], {}
+    for sender, target, content, tds in items:
+        msg_id = len(message_store)
+        message_store.append({"sender": sender, "target": target, "content": content})
+        for td in tds:
+            if td not in search_index: search_index[td] = []
+            search_index[td].append(msg_id)
+    return message_store, search_index
+
+def build_compact(items):
+    message_store, search_index = MessageStore(), PostingIndex()
+    for sender, target, content, tds in items:
+        search_index.add(message_store.append(sender, target, content), tds)
+    return message_store, search_index
+
+def legacy_search(search_index, tds):
+    postings = sorted((search_index.get(td, []) for td in tds), key=len)
+    matched = set(postings[0])
+    for plist in postings[1:]: matched.intersection_update(plist)
+    return sorted(matched)
+
+def measure(build, items):
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    store = build(items)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return store, after - before
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=200000)
+    parser.add_argument('--per-message', type=int, default=8)
+    parser.add_argument('--vocab', type=int, default=50000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    items = list(workload(args.messages, args.per_message, args.vocab, args.users))
+    postings = sum(len(tds) for *_, tds in items)
+    # 内容字符串两种布局共享同一对象，不计入差异
+    rnd = random.Random(7)
+    queries = [rnd.sample(items[rnd.randrange(len(items))][3], 1) + [items[rnd.randrange(len(items))][3][0]] for _ in range(args.queries)]
+
+    print(f"messages={args.messages}, postings={postings}")
+    print(f"{'layout':>10}{'total (MB)':>12}{'B/posting':>12}{'AND p50 (ms)':>14}")
+    for name, build, search in (('legacy', build_legacy, lambda s, q: legacy_search(s[1], q)),
+                                ('compact', build_compact, lambda s, q: s[1].search(q))):
+        store, used = measure(build, items)
+        samples = []
+        for q in queries:
+            start = time.perf_counter()
+            search(store, q)
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        print(f"{name:>10}{used / 1e6:>12.1f}{used / postings:>12.1f}{samples[len(samples) // 2]:>14.3f}")
+        del store
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager
+
+# search_index 搜索延迟: 旧版无主键堆表 vs (trapdoor, message_id) 主键的 WITHOUT ROWID 表，
+# 以及房间内不存在的关键词 (miss) 直接查表 vs 经过房间布隆过滤器
+# 运行: python -m benchmarks.sse_index [--rows 1000000 10000000] [--queries 20]
+
+SEARCH_SQL = """
+    SELECT m.id, m.sender, m.content_enc, m.msg_type, m.file_name, m.timestamp
+    FROM messages m
+    JOIN search_index idx ON m.id = idx.message_id
+    WHERE idx.trapdoor = ? AND m.room = ?
+    ORDER BY m.timestamp DESC
+"""
+
+def trapdoor(i):
+    return f"{i:064x}"
+
+def fill(conn, rows, per_message, vocab, rooms):
+    messages = rows // per_message
+    conn.executemany("INSERT INTO messages (id, room, sender, content_enc, msg_type, timestamp) VALUES (?, ?, 'u', 'x', 'text', ?)",
+                     ((i, f"room{i % rooms}", float(i)) for i in range(1, messages + 1)))
+    rnd = random.Random(42)
+    conn.executemany("INSERT OR IGNORE INTO search_index (trapdoor, message_id) VALUES (?, ?)",
+                     ((trapdoor(rnd.randrange(vocab)), i // per_message + 1) for i in range(messages * per_message)))
+    conn.commit()
+
+def legacy_db(folder):
+    conn = sqlite3.connect(os.path.join(folder, 'legacy.db'))
+    conn.execute("CREATE TABLE messages (id INTEGER PRIMARY KEY AUTOINCREMENT, room TEXT, sender TEXT, content_enc TEXT, msg_type TEXT DEFAULT 'text', file_name TEXT, timestamp REAL)")
+    conn.execute("CREATE TABLE search_index (trapdoor TEXT, message_id INTEGER)")
+    return conn
+
+def measure(conn, queries, vocab, rooms):
+    rnd = random.Random(7)
+    samples = []
+    for _ in range(queries):
+        args = (trapdoor(rnd.randrange(vocab)), f"room{rnd.randrange(rooms)}")
+        start = time.perf_counter()
+        conn.execute(SEARCH_SQL, args).fetchall()
+        samples.append((time.perf_counter() - start) * 1000)
+    return percentiles(samples)
+
+def percentiles(samples):
+    samples.sort()
+    return samples[len(samples) // 2], samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+def measure_misses(db, queries, vocab, rooms):
+    # 词表之外的陷门在任何房间都不存在
+    rnd = random.Random(11)
+    direct, filtered = [], []
+    for _ in range(queries):
+        args = (trapdoor(vocab + rnd.randrange(vocab)), f"room{rnd.randrange(rooms)}")
+        start = time.perf_counter()
+        db.conn.execute(SEARCH_SQL, args).fetchall()
+        mid = time.perf_counter()
+        db.search_encrypted(*args)
+        direct.append((mid - start) * 1000)
+        filtered.append((time.perf_counter() - mid) * 1000)
+    return percentiles(direct), percentiles(filtered)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000000, 10000000])
+    parser.add_argument('--per-message', type=int, default=8, help="每条消息的陷门数")
+    parser.add_argument('--vocab', type=int, default=50000)
+    parser.add_argument('--rooms', type=int, default=100)
+    parser.add_argument('--queries', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10}{'schema':>10}{'build (s)':>12}{'p50 (ms)':>12}{'p99 (ms)':>12}{'size (MB)':>12}")
+    blooms = []
+    for rows in args.rows:
+        folder = tempfile.mkdtemp()
+        try:
+            for schema in ('legacy', 'indexed'):
+                start = time.perf_counter()
+                if schema == 'legacy':
+                    conn = legacy_db(folder)
+                    path = os.path.join(folder, 'legacy.db')
+                else:
+                    db = DatabaseManager(os.path.join(folder, 'x.db'))
+                    conn = db.conn
+                    path = os.path.join(folder, 'secure_chat_final.db')
+                fill(conn, rows, args.per_message, args.vocab, args.rooms)
+                build = time.perf_counter() - start
+                p50, p99 = measure(conn, args.queries, args.vocab, args.rooms)
+                if schema == 'indexed':
+                    # fill 直接写表，绕过了 add_search_index，这里按高水位补录过滤器
+                    db.load_blooms()
+                    blooms.append((rows, *measure_misses(db, args.queries, args.vocab, args.rooms), db.bloom_stats()))
+                    # 关掉池里全部连接，WAL 才会检查点回主库文件
+                    db.close()
+                else: conn.close()
+                print(f"{rows:>10}{schema:>10}{build:>12.1f}{p50:>12.3f}{p99:>12.3f}{os.path.getsize(path) / 1e6:>12.1f}")
+        finally:
+            shutil.rmtree(folder)
+
+    print(f"\n{'rows':>10}{'miss p50 (ms)':>15}{'bloom p50 (ms)':>16}{'bloom (KB)':>12}{'est fp':>10}")
+    for rows, direct, filtered, stats in blooms:
+        print(f"{rows:>10}{direct[0]:>15.3f}{filtered[0]:>16.3f}{stats['bytes'] / 1024:>12.1f}{stats['est_fp_rate']:>10.4f}")
+
+if __name__ == '__main__':
+    main()
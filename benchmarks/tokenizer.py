@@ -0,0 +1,72 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.sse_utils import generate_trapdoor, generate_trapdoors, tokenize
+
+# 每条消息写入 search_index 的行数: 旧桌面端 text.split()、旧网页端 (去空白后单字 + 相邻二字) 对比 tokenize，
+# 以及逐个 / 批量生成陷门的耗时
+# 运行: python -m benchmarks.tokenizer [--corpus messages.txt]  (语料每行一条消息，缺省用内置样例)
+
+SAMPLE = """今天下午三点开会，记得带上季度报表。
+好的，我会准时到的！
+Can you send me the Q3 report before the meeting?
+项目进度怎么样了？后端接口联调完成了吗
+接口已经联调完了，前端还在改样式。
+晚上一起吃饭吗？公司楼下新开了一家火锅店
+Sure, let's meet at 7pm.
+服务器又挂了，麻烦看一下日志 error: connection refused
+重启之后好了，原因是数据库连接池满了。
+The deploy pipeline failed on the integration tests again.
+周五之前把加密模块的单元测试补齐
+收到，Paillier 同态加法那部分我来写。
+明天请假一天，有事打我电话 13800138000
+OK 没问题，注意休息
+这个 bug 在 Windows 上复现不了，Mac 上每次都会出现。
+Please review my PR when you have time, thanks!
+会议纪要已经发到群里了，大家看一下有没有遗漏。
+新版本的搜索功能支持中文了吗？
+支持了，现在按二元组分词，单字也能搜到。
+Weekend plan: hiking on Saturday, movie on Sunday."""
+
+def legacy_desktop(text):
+    return list(dict.fromkeys(text.split()))
+
+def legacy_web(text):
+    clean = "".join(text.split())
+    return list(dict.fromkeys([*clean, *(clean[i:i + 2] for i in range(len(clean) - 1))]))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--corpus', help="每行一条消息的文本文件")
+    parser.add_argument('--repeat', type=int, default=500, help="陷门生成计时的语料重复次数")
+    args = parser.parse_args()
+
+    if args.corpus:
+        with open(args.corpus, encoding='utf-8') as f: messages = [line.strip() for line in f if line.strip()]
+    else:
+        messages = SAMPLE.splitlines()
+
+    print(f"messages={len(messages)}")
+    print(f"{'tokenizer':<16}{'rows/msg':>10}{'distinct':>10}")
+    for name, fn in (('desktop split', legacy_desktop), ('web char+bigram', legacy_web), ('tokenize', tokenize)):
+        rows = [fn(m) for m in messages]
+        distinct = len({t for r in rows for t in r})
+        print(f"{name:<16}{sum(map(len, rows)) / len(messages):>10.1f}{distinct:>10}")
+
+    tokens = [tokenize(m) for m in messages] * args.repeat
+    count = sum(map(len, tokens))
+    for name, fn in (('sha256 single', lambda ts: [generate_trapdoor(t) for t in ts]),
+                     ('sha256 batch', generate_trapdoors),
+                     ('hmac single', lambda ts: [generate_trapdoors([t], 'alice_bob')[0] for t in ts]),
+                     ('hmac batch', lambda ts: generate_trapdoors(ts, 'alice_bob'))):
+        start = time.perf_counter()
+        for ts in tokens: fn(ts)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<16}{count / elapsed:>12.0f} trapdoors/s")
+
+if __name__ == '__main__':
+    main()
@@ -11,13 +11,18 @@ root_dir = os.path.dirname(current_dir)
 sys.path.append(root_dir)
 
 from core.crypto_utils import AESCipher
-from core.paillier import SimplePaillier
-from core.sse_utils import generate_trapdoor, extract_keywords
+from core.paillier import SimplePaillier, PaillierPrivateKey, RandomnessPool, PackedEncoder
+from core.sse_utils import generate_trapdoors, tokenize
+from core.pir import build_query, decode_answer, directory_slot, directory_match
+from core.wire import JSONReader, BINARY_CODEC, encode_public_key, encode_ciphertexts, decode_ciphertexts, decode_ciphertext
 from client.secure_db import save_keys, load_keys
 
 with open(os.path.join(root_dir, 'config.json'), 'r') as f:
     CONFIG = json.load(f)
 
+# 薪资批量上报的槽位参数: 单条 < 2^32，服务端累加器预留 2^20 次相加的进位余量
+SALARY_PACKING = {"value_bits": 32, "additions": (1 << 20) - 1}
+
 class SecureChatApp:
     def __init__(self, root):
         self.root = root
@@ -32,6 +37,10 @@ class SecureChatApp:
         self.aes = AESCipher(CONFIG['shared_secret'])
         self.paillier = SimplePaillier()
         self.pub_k, self.priv_k = None, None
+        self.rand_pool = None
+        self.salary_encoder = None
+        self.pir_pending, self.pir_target, self.pir_row = None, None, None
+        self.codec = None
         self.is_connected = False
         
         self.main_container = tk.Frame(root)
@@ -117,11 +126,17 @@ class SecureChatApp:
                 if not self.pub_k:
                     self.pub_k, self.priv_k = self.paillier.generate_keys(128)
                     save_keys(u, self.pub_k, self.priv_k)
+                # 旧版 (lmb, mu) 私钥也升级为 CRT 私钥对象，解密走 p^2 / q^2
+                self.priv_k = PaillierPrivateKey.load(self.priv_k, self.pub_k) or self.priv_k
+                # 后台预计算 r^n，PIR 查询向量 / 薪资上报的在线加密只剩一次乘法
+                self.rand_pool = RandomnessPool(self.pub_k, priv=self.priv_k)
+                self.salary_encoder = PackedEncoder(self.pub_k, **SALARY_PACKING)
                 
                 t = threading.Thread(target=self.recv_loop, daemon=True)
                 t.start()
                 
                 self.show_main_screen()
+                self.sock.send(json.dumps({"action": "HELLO", "codecs": [BINARY_CODEC]}).encode())
                 self.sock.send(json.dumps({"action": "GET_FRIENDS"}).encode())
             else:
                 messagebox.showerror("登录失败", resp['msg'])
@@ -184,12 +199,12 @@ class SecureChatApp:
         self.chat_display.config(state='disabled')
 
     def recv_loop(self):
+        reader = JSONReader(self.sock)
         while True:
             try:
-                msg = self.sock.recv(8192).decode('utf-8')
-                if not msg: break
-                try: data = json.loads(msg)
-                except: continue
+                try: data = reader.read()
+                except json.JSONDecodeError: continue
+                if data is None: break
                 
                 msg_type = data.get('type')
                 if msg_type == 'NEW_MSG':
@@ -200,6 +215,8 @@ class SecureChatApp:
                     try: content = self.aes.decrypt(data['content'])
                     except: content = "..."
                     self.log(f"我: {content}", 'me')
+                elif msg_type == 'HELLO':
+                    self.codec = data.get('codec')
                 elif msg_type == 'FRIEND_LIST':
                     self.friend_list.delete(0, tk.END)
                     self.friend_list.insert(tk.END, "ALL")
@@ -211,14 +228,22 @@ class SecureChatApp:
                         except: dec = "???"
                         res += f"- {r['sender']}: {dec}\n"
                     messagebox.showinfo("搜索结果", res)
+                elif msg_type == 'PIR_INFO' and self.pir_pending:
+                    # 本地算出目标所在的行列，只对列发送加密选择子
+                    row, col = divmod(directory_slot(self.pir_pending, data['rows'] * data['cols']), data['cols'])
+                    self.pir_target, self.pir_pending = self.pir_pending, None
+                    self.pir_row = row
+                    vec = build_query(self.pub_k, col, data['cols'], pool=self.rand_pool)
+                    self.sock.sendall(json.dumps({"action": "PIR_QUERY", "set": data['set'], "query_vector": self.wire_ciphertexts(vec), "pub_key": self.wire_pub()}).encode())
                 elif msg_type == 'PIR_RES':
-                    val = self.paillier.decrypt(self.priv_k, self.pub_k, data['result'])
-                    exists = "✅ 存在" if val >= 1 else "❌ 不存在"
+                    val = decode_answer(self.priv_k, self.pub_k, decode_ciphertexts(self.pub_k, data['results']), self.pir_row)
+                    exists = "✅ 存在" if directory_match(val, self.pir_target) else "❌ 不存在"
                     messagebox.showinfo("PIR 结果", f"隐匿查询结果: {exists}")
                 elif msg_type == 'SALARY_RES':
-                    total = self.paillier.decrypt(self.priv_k, self.pub_k, data['enc_sum'])
+                    total = sum(self.salary_encoder.unpack(self.paillier.decrypt(self.priv_k, self.pub_k, decode_ciphertext(self.pub_k, data['enc_sum']))))
                     avg = total / data['count']
-                    messagebox.showinfo("隐私计算", f"平均薪资: {avg:.2f}")
+                    label = f"[{data['group']}] " if data.get('group') else ""
+                    messagebox.showinfo("隐私计算", f"{label}平均薪资: {avg:.2f}")
                 elif 'msg' in data:
                     self.log(f"[系统]: {data['msg']}", 'system')
             except Exception as e:
@@ -230,7 +255,7 @@ class SecureChatApp:
         if not txt: return
         target = self.lbl_target.cget("text")
         enc = self.aes.encrypt(txt)
-        tds = [generate_trapdoor(k) for k in extract_keywords(txt)]
+        tds = generate_trapdoors(tokenize(txt))
         self.sock.send(json.dumps({"action": "SEND_MSG", "target": target, "cipher_text": enc, "trapdoors": tds}).encode())
         self.entry_msg.delete(0, tk.END)
 
@@ -245,19 +270,35 @@ class SecureChatApp:
             self.root.after(1000, lambda: self.sock.send(json.dumps({"action": "GET_FRIENDS"}).encode()))
             
     def search_ui(self):
-        k = simpledialog.askstring("搜索", "关键词:")
-        if k: self.sock.send(json.dumps({"action": "SEARCH", "trapdoor": generate_trapdoor(k)}).encode())
+        k = simpledialog.askstring("搜索", "关键词 (空格分隔为 AND，| 分隔为 OR):")
+        if not k: return
+        mode = 'or' if '|' in k else 'and'
+        # 与建索引同一套分词 (中文按二元组)；OR 时各部分的词一并取并集
+        tokens = list(dict.fromkeys(t for part in k.split('|') for t in tokenize(part, query=True)))
+        if tokens: self.sock.send(json.dumps({"action": "SEARCH", "trapdoors": generate_trapdoors(tokens), "mode": mode}).encode())
         
     def pir_ui(self):
         t = simpledialog.askstring("PIR", "查询用户:")
         if t:
-            vec = [self.paillier.encrypt(self.pub_k, 1 if u == t else 0) for u in ["Alice", "Bob", "Charlie", "David"]]
-            self.sock.send(json.dumps({"action": "PIR_QUERY", "query_vector": vec, "pub_key": self.pub_k}).encode())
+            self.pir_pending = t
+            self.sock.send(json.dumps({"action": "PIR_INFO", "set": "users"}).encode())
             
     def salary_ui(self):
-        s = simpledialog.askinteger("薪资", "金额:")
-        if s: self.sock.send(json.dumps({"action": "COMPUTE_SALARY", "enc_salary": self.paillier.encrypt(self.pub_k, s)}).encode())
-        if messagebox.askyesno("计算", "计算平均值?"): self.sock.send(json.dumps({"action": "GET_AVG_SALARY", "pub_key": self.pub_k}).encode())
+        raw = simpledialog.askstring("薪资", "金额 (多个用空格分隔):")
+        try: amounts = [int(x) for x in raw.split()] if raw else []
+        except ValueError: return messagebox.showwarning("提示", "请输入整数金额")
+        group = simpledialog.askstring("薪资", "部门 (可留空):") or None
+        if amounts:
+            enc = self.salary_encoder.encrypt(amounts, pool=self.rand_pool)
+            self.sock.send(json.dumps({"action": "COMPUTE_SALARY", "enc_salaries": self.wire_ciphertexts(enc), "count": len(amounts), "pub_key": self.wire_pub(), "group": group}).encode())
+        if messagebox.askyesno("计算", "计算平均值?"): self.sock.send(json.dumps({"action": "GET_AVG_SALARY", "pub_key": self.wire_pub(), "group": group}).encode())
+
+    # 已与服务端协商二进制编码时，公钥与密文以 base64url 定宽字节发送
+    def wire_pub(self):
+        return encode_public_key(self.pub_k) if self.codec else self.pub_k
+
+    def wire_ciphertexts(self, cs):
+        return encode_ciphertexts(self.pub_k, cs) if self.codec else cs
 
 def start_client_gui():
     root = tk.Tk()
@@ -0,0 +1,142 @@
+import hashlib
+import math
+import struct
+
+# 布隆过滤器: 判定 "一定不存在" 或 "可能存在"。k 个位置由一次 blake2b 的两半做双重哈希得到 (h1 + i*h2)
+_HEADER = struct.Struct('>IIdB')
+_MAGIC = b'SCBF1'
+
+
+class BloomFilter:
+    def __init__(self, capacity=1024, error_rate=0.01, bits=None, count=0):
+        self.capacity = max(1, int(capacity))
+        self.error_rate = error_rate
+        # 最优位数 m = -n ln p / (ln 2)^2，哈希个数 k = m/n ln 2
+        m = max(64, math.ceil(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.m = (m + 7) // 8 * 8
+        self.k = max(1, round(self.m / self.capacity * math.log(2)))
+        self.bits = bytearray(bits) if bits is not None else bytearray(self.m // 8)
+        self.count = count
+        # 置位数随 add 增量维护，估计误判率时不必扫描整个位数组
+        self.ones = int.from_bytes(self.bits, 'big').bit_count() if bits is not None else 0
+
+    def _positions(self, item):
+        h = hashlib.blake2b(item.encode() if isinstance(item, str) else item, digest_size=16).digest()
+        h1, h2 = int.from_bytes(h[:8], 'little'), int.from_bytes(h[8:], 'little') | 1
+        return [(h1 + i * h2) % self.m for i in range(self.k)]
+
+    def add(self, item):
+        # 返回 True 表示新置位了至少一位 (即 item 之前一定不在过滤器里)
+        added = False
+        for pos in self._positions(item):
+            byte, bit = pos >> 3, 1 << (pos & 7)
+            if not self.bits[byte] & bit:
+                self.bits[byte] |= bit
+                self.ones += 1
+                added = True
+        if added: self.count += 1
+        return added
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        return len(self.bits)
+
+    def estimated_fp_rate(self):
+        # 按实际置位比例估计: (置位数 / m)^k
+        return (self.ones / self.m) ** self.k
+
+    def to_bytes(self):
+        return _HEADER.pack(self.capacity, self.count, self.error_rate, self.k) + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, raw):
+        capacity, count, error_rate, _ = _HEADER.unpack_from(raw)
+        if not 0 < error_rate < 1: raise ValueError("布隆过滤器参数无效")
+        bf = cls(capacity, error_rate, raw[_HEADER.size:], count)
+        if len(bf.bits) != bf.m // 8: raise ValueError("布隆过滤器位数组长度不符")
+        return bf
+
+
+class ScalableBloomFilter:
+    # 元素数不可预知时逐层扩容: 当前层装满后新开一层，容量翻倍、误判率减半，
+    # 总误判率不超过 error_rate / (1 - 1/2) = 2 * error_rate，且无需回源重建
+    def __init__(self, capacity=1024, error_rate=0.005, layers=None):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.layers = layers or [BloomFilter(capacity, error_rate)]
+
+    def add(self, item):
+        if item in self: return False
+        layer = self.layers[-1]
+        if layer.count >= layer.capacity:
+            layer = BloomFilter(layer.capacity * 2, layer.error_rate / 2)
+            self.layers.append(layer)
+        return layer.add(item)
+
+    def __contains__(self, item):
+        return any(item in layer for layer in self.layers)
+
+    def __len__(self):
+        return sum(layer.count for layer in self.layers)
+
+    @property
+    def nbytes(self):
+        return sum(layer.nbytes for layer in self.layers)
+
+    def estimated_fp_rate(self):
+        return 1 - math.prod(1 - layer.estimated_fp_rate() for layer in self.layers)
+
+    def to_bytes(self):
+        out = [struct.pack('>IdH', self.capacity, self.error_rate, len(self.layers))]
+        for layer in self.layers:
+            raw = layer.to_bytes()
+            out.append(struct.pack('>I', len(raw)) + raw)
+        return b''.join(out)
+
+    @classmethod
+    def from_bytes(cls, raw):
+        capacity, error_rate, count = struct.unpack_from('>IdH', raw)
+        offset, layers = struct.calcsize('>IdH'), []
+        for _ in range(count):
+            size, = struct.unpack_from('>I', raw, offset)
+            layers.append(BloomFilter.from_bytes(raw[offset + 4:offset + 4 + size]))
+            offset += 4 + size
+        return cls(capacity, error_rate, layers)
+
+
+def dump_filters(filters, high_water):
+    # 文件格式: magic | 已纳入的最大 message_id | 房间数 | (房间名长度, 房间名, 过滤器长度, 过滤器)...
+    out = [_MAGIC, struct.pack('>QI', high_water, len(filters))]
+    for name, bf in filters.items():
+        key, raw = name.encode(), bf.to_bytes()
+        out.append(struct.pack('>H', len(key)) + key + struct.pack('>I', len(raw)) + raw)
+    return b''.join(out)
+
+
+def _take(raw, offset, size):
+    if offset + size > len(raw): raise ValueError("布隆过滤器文件被截断")
+    return raw[offset:offset + size]
+
+
+def load_filters(raw):
+    # 截断或损坏的文件一律报 ValueError，调用方据此回源重建
+    if not raw.startswith(_MAGIC): raise ValueError("未知的布隆过滤器文件格式")
+    try:
+        high_water, count = struct.unpack_from('>QI', raw, len(_MAGIC))
+        offset, filters = len(_MAGIC) + 12, {}
+        for _ in range(count):
+            size, = struct.unpack_from('>H', raw, offset)
+            name = _take(raw, offset + 2, size).decode()
+            offset += 2 + size
+            size, = struct.unpack_from('>I', raw, offset)
+            filters[name] = ScalableBloomFilter.from_bytes(_take(raw, offset + 4, size))
+            offset += 4 + size
+    except struct.error as e:
+        raise ValueError(f"布隆过滤器文件损坏: {e}") from e
+    return filters, high_water
@@ -0,0 +1,80 @@
+import sys
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    # 按字节数限容的 LRU: 每个条目的大小由 sizeof(value) 估算，总量超过 max_bytes 时从最久未用的一端淘汰。
+    # 大于 max_bytes 的值不缓存
+    def __init__(self, max_bytes=16 * 1024 * 1024, sizeof=sys.getsizeof):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.updates = 0
+        self._items = OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            self.discard(key)
+            if size > self.max_bytes: return False
+            self._items[key] = (value, size)
+            self.bytes += size
+            self._evict()
+            return True
+
+    def update(self, key, fn):
+        # 原地更新已缓存的值 (不影响命中统计与 LRU 顺序)，返回是否存在该条目
+        with self._lock:
+            item = self._items.get(key)
+            if item is None: return False
+            value = fn(item[0])
+            size = self.sizeof(value)
+            self._items[key] = (value, size)
+            self.bytes += size - item[1]
+            self.updates += 1
+            self._evict()
+            return True
+
+    def discard(self, key):
+        with self._lock:
+            item = self._items.pop(key, None)
+            if item is not None: self.bytes -= item[1]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.bytes = 0
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and self._items:
+            _, (_, size) = self._items.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {"entries": len(self._items), "bytes": self.bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses, "hit_ratio": self.hits / total if total else 0.0,
+                    "evictions": self.evictions, "updates": self.updates}
@@ -1,9 +1,16 @@
 import base64
 import hashlib
+import os
+import struct
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from itertools import chain
 from Crypto.Cipher import AES
 from Crypto.Util.Padding import pad, unpad
 from Crypto.Util import number
-from Crypto.Protocol.KDF import PBKDF2
+from Crypto.Protocol.KDF import PBKDF2, HKDF
 from Crypto.Random import get_random_bytes # <--- 这是一个独立的函数
 from Crypto.Hash import SHA256
 
@@ -13,6 +20,10 @@ class AESCipher:
         self.key = hashlib.sha256(key_str.encode()).digest()
 
     def encrypt(self, raw):
+        return base64.b64encode(self.encrypt_bytes(raw)).decode('utf-8')
+
+    def encrypt_bytes(self, raw):
+        # 返回原始 IV||密文 (数据库按 BLOB 存储)，base64 只在接口边缘生成
         if not isinstance(raw, str):
             raw = str(raw)
         raw = pad(raw.encode(), self.bs)
@@ -24,14 +35,168 @@ class AESCipher:
         # -----------------
         
         cipher = AES.new(self.key, AES.MODE_CBC, iv)
-        return base64.b64encode(iv + cipher.encrypt(raw)).decode('utf-8')
+        return iv + cipher.encrypt(raw)
 
     def decrypt(self, enc):
-        enc = base64.b64decode(enc)
+        enc = ciphertext_bytes(enc)
         iv = enc[:self.bs]
         cipher = AES.new(self.key, AES.MODE_CBC, iv)
         return unpad(cipher.decrypt(enc[self.bs:]), self.bs).decode('utf-8')
 
+    # --- 批量接口: 结果与输入一一对应，单条失败时该位置放异常对象，不影响其它消息 ---
+    def decrypt_many(self, encs, workers=None, chunk=1024):
+        encs = list(encs)
+        if workers == 1 or len(encs) <= chunk: return self._decrypt_batch(encs)
+        parts = [encs[i:i + chunk] for i in range(0, len(encs), chunk)]
+        return list(chain.from_iterable(_get_pool(workers).map(self._decrypt_batch, parts)))
+
+    def _decrypt_batch(self, encs):
+        # CBC 解密 P_i = D(C_i) xor C_{i-1}: 整批密文块拼进一个缓冲区，只建一个 ECB 对象做一次解密，
+        # 再与 "前一块" 缓冲区 (IV 与各密文块错位一格) 做一次大整数异或，最后逐条去填充
+        bs = self.bs
+        out = [None] * len(encs)
+        spans, body, prev = [], bytearray(), bytearray()
+        for i, enc in enumerate(encs):
+            try:
+                raw = ciphertext_bytes(enc)
+                if len(raw) < 2 * bs or len(raw) % bs: raise ValueError("密文长度不正确")
+            except (ValueError, TypeError) as e:
+                out[i] = e
+                continue
+            spans.append((i, len(body), len(raw) - bs))
+            body += memoryview(raw)[bs:]
+            prev += memoryview(raw)[:-bs]
+        if body:
+            plain = AES.new(self.key, AES.MODE_ECB).decrypt(body)
+            plain = (int.from_bytes(plain, 'big') ^ int.from_bytes(prev, 'big')).to_bytes(len(body), 'big')
+            for i, start, size in spans:
+                try: out[i] = unpad(plain[start:start + size], bs).decode('utf-8')
+                except (ValueError, UnicodeDecodeError) as e: out[i] = e
+        return out
+
+    def encrypt_many(self, raws, workers=None, chunk=1024, binary=False):
+        # binary=True 时返回原始 IV||密文，否则为 base64 文本
+        raws = list(raws)
+        if workers == 1 or len(raws) <= chunk: return self._encrypt_batch(raws, binary)
+        parts = [raws[i:i + chunk] for i in range(0, len(raws), chunk)]
+        return list(chain.from_iterable(_get_pool(workers).map(lambda part: self._encrypt_batch(part, binary), parts)))
+
+    def _encrypt_batch(self, raws, binary=False):
+        # CBC 加密有链式依赖，只能逐条建对象；IV 一次取够整批
+        bs = self.bs
+        ivs = get_random_bytes(bs * len(raws))
+        out = []
+        for i, raw in enumerate(raws):
+            iv = ivs[i * bs:(i + 1) * bs]
+            data = pad((raw if isinstance(raw, str) else str(raw)).encode(), bs)
+            enc = iv + AES.new(self.key, AES.MODE_CBC, iv).encrypt(data)
+            out.append(enc if binary else base64.b64encode(enc).decode('utf-8'))
+        return out
+
+
+# 密文在库里是 BLOB，在 JSON 接口上是 base64 文本；两个方向都接受任一形式
+def ciphertext_bytes(value):
+    return bytes(value) if isinstance(value, (bytes, bytearray, memoryview)) else base64.b64decode(value)
+
+def ciphertext_text(value):
+    return value if isinstance(value, str) else base64.b64encode(value).decode('ascii')
+
+
+class StreamCipher:
+    # 分块流式 AEAD (上传文件等大数据): 明文按 chunk_size 切块，每块独立 AES-GCM 加密并附 16 字节标签。
+    # 文件格式: MAGIC(4) | chunk_size(4) | salt(16) | 块密文||标签 ...
+    # 每个文件由 HKDF(主密钥, salt) 派生独立密钥；nonce = 块序号(11 字节) || 末块标记(1 字节)，头部作为附加数据，
+    # 块被调换、删改、截断或拼接都无法通过校验。加解密都只缓冲一个块，内存占用与文件大小无关；
+    # 块定长可直接定位，区间读取只解密涉及的块
+    MAGIC = b'SCE1'
+    HEADER_SIZE = 24
+    TAG_SIZE = 16
+
+    def __init__(self, key_str, chunk_size=64 * 1024):
+        self.key = hashlib.sha256(key_str.encode()).digest()
+        self.chunk_size = chunk_size
+
+    def _cipher(self, key, header, index, last):
+        cipher = AES.new(key, AES.MODE_GCM, nonce=index.to_bytes(11, 'big') + (b'\x01' if last else b'\x00'))
+        cipher.update(header)
+        return cipher
+
+    def encrypt_stream(self, src, dst):
+        # src / dst 为文件对象，返回明文字节数。多读一块才知道当前块是不是末块
+        salt = get_random_bytes(16)
+        header = self.MAGIC + struct.pack('>I', self.chunk_size) + salt
+        key = HKDF(self.key, 32, salt, SHA256)
+        dst.write(header)
+        total, index = 0, 0
+        chunk = _read_full(src, self.chunk_size)
+        while True:
+            nxt = _read_full(src, self.chunk_size) if len(chunk) == self.chunk_size else b''
+            ct, tag = self._cipher(key, header, index, not nxt).encrypt_and_digest(chunk)
+            dst.write(ct)
+            dst.write(tag)
+            total += len(chunk)
+            if not nxt: return total
+            chunk, index = nxt, index + 1
+
+    def _layout(self, f):
+        f.seek(0)
+        header = f.read(self.HEADER_SIZE)
+        if len(header) != self.HEADER_SIZE or header[:4] != self.MAGIC: raise ValueError("不是分块加密文件")
+        chunk_size = struct.unpack('>I', header[4:8])[0]
+        body = f.seek(0, 2) - self.HEADER_SIZE
+        count = max(1, -(-body // (chunk_size + self.TAG_SIZE)))
+        size = body - count * self.TAG_SIZE
+        if size < 0 or size > count * chunk_size: raise ValueError("加密文件长度不正确")
+        return header, HKDF(self.key, 32, header[8:], SHA256), chunk_size, count, size
+
+    def plaintext_size(self, f):
+        return self._layout(f)[4]
+
+    def decrypt_range(self, f, start=0, stop=None):
+        # 逐块产出明文 [start, stop)；校验失败抛 ValueError
+        header, key, chunk_size, count, size = self._layout(f)
+        stop = size if stop is None else min(stop, size)
+        if start >= stop:
+            # 空区间也校验一次末块，避免把被截断的文件当成空文件
+            if size == 0: self._decrypt_chunk(f, header, key, chunk_size, count, 0)
+            return
+        for index in range(start // chunk_size, (stop - 1) // chunk_size + 1):
+            base = index * chunk_size
+            yield self._decrypt_chunk(f, header, key, chunk_size, count, index)[max(start - base, 0):stop - base]
+
+    def _decrypt_chunk(self, f, header, key, chunk_size, count, index):
+        f.seek(self.HEADER_SIZE + index * (chunk_size + self.TAG_SIZE))
+        block = f.read(chunk_size + self.TAG_SIZE)
+        return self._cipher(key, header, index, index == count - 1).decrypt_and_verify(block[:-self.TAG_SIZE], block[-self.TAG_SIZE:])
+
+    def decrypt_stream(self, src, dst):
+        total = 0
+        for piece in self.decrypt_range(src):
+            dst.write(piece)
+            total += len(piece)
+        return total
+
+
+def _read_full(f, size):
+    # 网络流的 read 可能提前返回，读满 size 或到 EOF 为止
+    buf = f.read(size)
+    while buf and len(buf) < size:
+        more = f.read(size - len(buf))
+        if not more: break
+        buf += more
+    return buf
+
+
+# pycryptodome 的 C 实现在加解密时释放 GIL，大批量按块分给线程池
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _get_pool(workers=None):
+    workers = workers or os.cpu_count() or 1
+    with _pools_lock:
+        if workers not in _pools: _pools[workers] = ThreadPoolExecutor(max_workers=workers)
+        return _pools[workers]
+
 def hash_password(password, salt=None):
     if not salt:
         # --- [修正点 2] ---
@@ -48,4 +213,92 @@ def hash_password(password, salt=None):
 
 def verify_password(stored_key, stored_salt, input_password):
     key, _ = hash_password(input_password, stored_salt)
-    return key == stored_key
\ No newline at end of file
+    return key == stored_key
+
+
+class PasswordHasher:
+    # PBKDF2 (10 万轮) 放到独立工作进程里算，避免阻塞 eventlet 事件循环。
+    # 排队 + 计算中的任务数达到 max_pending 时直接拒绝 (返回 None)，调用方应回复“繁忙”而不是继续排队。
+    # sleep 为等待结果时的让出函数: eventlet 下传 socketio.sleep，普通线程用默认的阻塞等待
+    def __init__(self, processes=None, max_pending=None, sleep=None):
+        self.processes = processes or os.cpu_count() or 1
+        self.max_pending = max_pending or self.processes * 8
+        self.sleep = sleep
+        self.completed = 0
+        self.rejected = 0
+        self.peak = 0
+        self._pending = 0
+        self._queue_ms = deque(maxlen=256)
+        self._total_ms = deque(maxlen=256)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._closed = False
+
+    def start(self):
+        with self._lock: self._get_executor()
+        return self
+
+    def _get_executor(self):
+        # 调用方持有 self._lock；shutdown 之后不再重建进程池，返回 None
+        if self._executor is None and not self._closed: self._executor = ProcessPoolExecutor(max_workers=self.processes)
+        return self._executor
+
+    def shutdown(self):
+        with self._lock: executor, self._executor, self._closed = self._executor, None, True
+        if executor is not None: executor.shutdown()
+
+    def _run(self, fn, *args):
+        with self._lock:
+            executor = self._get_executor()
+            if executor is None or self._pending >= self.max_pending:
+                self.rejected += 1
+                return None
+            self._pending += 1
+            self.peak = max(self.peak, self._pending)
+        start = time.perf_counter()
+        try:
+            # 取到 executor 之后仍可能与 shutdown 交错，此时 submit 抛 RuntimeError，同样按繁忙处理
+            try: fut = executor.submit(_timed, fn, *args)
+            except RuntimeError:
+                with self._lock: self.rejected += 1
+                return None
+            if self.sleep is None: result, ran_ms = fut.result()
+            else:
+                # 让出间隔从 2 ms 起倍增到 20 ms: 一次 PBKDF2 约几十毫秒，只需轮询几次
+                delay = 0.002
+                while not fut.done():
+                    self.sleep(delay)
+                    delay = min(delay * 2, 0.02)
+                result, ran_ms = fut.result()
+        finally:
+            with self._lock: self._pending -= 1
+        total_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.completed += 1
+            self._total_ms.append(total_ms)
+            self._queue_ms.append(max(0.0, total_ms - ran_ms))
+        return result
+
+    def hash(self, password, salt=None):
+        # 返回 (key, salt)；池满时返回 None
+        return self._run(hash_password, password, salt)
+
+    def verify(self, stored_key, stored_salt, input_password):
+        # 返回 True / False；池满时返回 None
+        return self._run(verify_password, stored_key, stored_salt, input_password)
+
+    def stats(self):
+        with self._lock:
+            total = sorted(self._total_ms)
+            return {"processes": self.processes, "max_pending": self.max_pending, "pending": self._pending,
+                    "peak_pending": self.peak, "completed": self.completed, "rejected": self.rejected,
+                    "queue_ms_avg": sum(self._queue_ms) / len(self._queue_ms) if self._queue_ms else 0.0,
+                    "total_ms_p50": total[len(total) // 2] if total else 0.0,
+                    "total_ms_p95": total[int(len(total) * 0.95)] if total else 0.0}
+
+
+def _timed(fn, *args):
+    # 在工作进程中执行，附带纯计算耗时，用于区分排队时间
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
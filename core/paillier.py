@@ -1,6 +1,314 @@
+import math
+import os
 import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import chain, islice
 from Crypto.Util import number
 
+
+class PaillierPrivateKey(tuple):
+    # 序列化形式为 (lmb, mu, p, q)，json.dump 后仍是普通列表；
+    # 前两项与旧版 (lmb, mu) 私钥一致，额外保留 p, q 以便走 CRT 加速
+    def __new__(cls, p, q):
+        n = p * q
+        lmb = (p - 1) * (q - 1)
+        self = super().__new__(cls, (lmb, number.inverse(lmb, n), p, q))
+        self.p, self.q, self.n = p, q, n
+        self.p_sq, self.q_sq = p * p, q * q
+        self.n_sq = n * n
+        # 解密: m_p = L_p(c^(p-1) mod p^2) * hp mod p，q 同理
+        g = n + 1
+        self.hp = number.inverse((pow(g, p - 1, self.p_sq) - 1) // p, p)
+        self.hq = number.inverse((pow(g, q - 1, self.q_sq) - 1) // q, q)
+        self.q_inv_p = number.inverse(q, p)
+        # 加密: r^n 在 Z_{p^2}* 中的指数可以约到 p(p-1)
+        self.n_mod_p = n % (p * (p - 1))
+        self.n_mod_q = n % (q * (q - 1))
+        self.q_sq_inv_p_sq = number.inverse(self.q_sq, self.p_sq)
+        return self
+
+    def __getnewargs__(self):
+        return (self.p, self.q)
+
+    @classmethod
+    def load(cls, priv, pub):
+        # 兼容三种格式: 本类实例 / [lmb, mu, p, q] / 旧版 [lmb, mu]
+        n = int(pub[0])
+        # CRT 公式写死了 g = n + 1；其它 g 返回 None，由调用方走 λ/μ 路径
+        if int(pub[1]) != n + 1: return None
+        if isinstance(priv, cls): return priv
+        priv = tuple(int(x) for x in priv)
+        if len(priv) == 4: return _key_from_factors(priv[2], priv[3])
+        return _key_from_legacy(n, priv[0])
+
+    def decrypt(self, c):
+        c = int(c)
+        mp = (pow(c, self.p - 1, self.p_sq) - 1) // self.p * self.hp % self.p
+        mq = (pow(c, self.q - 1, self.q_sq) - 1) // self.q * self.hq % self.q
+        return mq + self.q * ((mp - mq) * self.q_inv_p % self.p)
+
+    def randomizer(self, r=None):
+        # r^n mod n^2，分别在 p^2 / q^2 下计算后 CRT 合并
+        if r is None: r = random.randint(1, self.n - 1)
+        xp = pow(r, self.n_mod_p, self.p_sq)
+        xq = pow(r, self.n_mod_q, self.q_sq)
+        return xq + self.q_sq * ((xp - xq) * self.q_sq_inv_p_sq % self.p_sq)
+
+    def encrypt(self, m, r=None):
+        # 持钥方加密: g^m = 1 + m*n (g = n + 1)
+        return (1 + m * self.n) * self.randomizer(r) % self.n_sq
+
+
+@lru_cache(maxsize=64)
+def _key_from_factors(p, q):
+    return PaillierPrivateKey(p, q)
+
+
+@lru_cache(maxsize=64)
+def _key_from_legacy(n, lmb):
+    # 旧私钥 lmb = (p-1)(q-1)，因此 p + q = n - lmb + 1，解一元二次方程恢复 p, q
+    s = n - lmb + 1
+    d = s * s - 4 * n
+    if d < 0: return None
+    t = math.isqrt(d)
+    p, q = (s + t) // 2, (s - t) // 2
+    if t * t != d or q <= 1 or p * q != n: return None
+    return _key_from_factors(p, q)
+
+
+class RandomnessPool:
+    # 离线/在线加密: 后台线程预先计算 r^n mod n^2，在线加密只剩一次乘法。
+    # 剩余量降到 low_water 时补满到 size；池空时当场计算并记一次 miss。
+    # 持有私钥时 (priv) 预计算走 CRT，比直接模 n^2 快 3~4 倍
+    def __init__(self, pub, size=64, low_water=16, priv=None, start=True):
+        self.n = int(pub[0])
+        self.n_sq = self.n * self.n
+        self.priv = PaillierPrivateKey.load(priv, pub) if priv is not None else None
+        self.size = max(1, size)
+        self.low_water = min(low_water, self.size - 1)
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+        if start: self.start()
+
+    def _compute(self):
+        if self.priv is not None: return self.priv.randomizer()
+        return pow(random.randint(1, self.n - 1), self.n, self.n_sq)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and len(self._items) > self.low_water: self._cond.wait()
+                if self._closed: return
+            while not self._closed and len(self._items) < self.size:
+                rn = self._compute()
+                with self._cond:
+                    self._items.append(rn)
+                    self.generated += 1
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def take(self):
+        with self._cond:
+            if self._items:
+                self.hits += 1
+                rn = self._items.popleft()
+                if len(self._items) <= self.low_water: self._cond.notify()
+                return rn
+            self.misses += 1
+            self._cond.notify()
+        return self._compute()
+
+    def stats(self):
+        with self._cond:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "available": len(self._items),
+                    "generated": self.generated, "hit_rate": self.hits / total if total else 0.0}
+
+
+def _product_mod(n_sq, ciphertexts):
+    # 平衡乘积树: 按二进制计数器方式合并同层结果，只保留 O(log N) 个中间值，可直接消费生成器
+    stack = []
+    for c in ciphertexts:
+        c, level = int(c), 0
+        while stack and stack[-1][0] == level:
+            c = stack.pop()[1] * c % n_sq
+            level += 1
+        stack.append((level, c))
+    result = 1
+    while stack: result = result * stack.pop()[1] % n_sq
+    return result
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+def _get_executor(processes):
+    with _executors_lock:
+        if processes not in _executors: _executors[processes] = ProcessPoolExecutor(max_workers=processes)
+        return _executors[processes]
+
+
+def _parallel_reduce(worker, n_sq, items, chunk_size, processes):
+    # worker(n_sq, chunk) 把一段输入归约为一个密文，各段结果再相乘。
+    # 输入不足一个 chunk (或 processes=1) 时在本进程归约；否则按 chunk 分发到进程池，
+    # 同时在途的 chunk 数不超过 processes * 2，长生成器不会整体驻留内存
+    processes = processes or os.cpu_count() or 1
+    it = iter(items)
+    first = list(islice(it, chunk_size))
+    if len(first) < chunk_size or processes == 1: return worker(n_sq, chain(first, it))
+
+    executor = _get_executor(processes)
+    chunks = chain([first], iter(lambda: list(islice(it, chunk_size)), []))
+
+    def partials():
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(worker, n_sq, chunk))
+            if len(pending) >= processes * 2: yield pending.popleft().result()
+        while pending: yield pending.popleft().result()
+
+    return _product_mod(n_sq, partials())
+
+
+def sum_ciphertexts(pub, ciphertexts, chunk_size=4096, processes=1):
+    # 同态求和 E(m1 + m2 + ...) = c1 * c2 * ... mod n^2，n^2 只算一次。空输入返回 E(0) 的平凡密文 1。
+    # 每个元素只是一次模乘，默认在本进程归约 (与 multi_exp 一致)，不在 eventlet 进程里派生进程池；
+    # 已知是 10^5~10^6 级的大批量时再显式传 processes (0 / None 为 CPU 数)，分块与进程池见 _parallel_reduce
+    n = int(pub[0])
+    return _parallel_reduce(_product_mod, n * n, ciphertexts, chunk_size, processes)
+
+
+def _multi_exp_mod(n_sq, pairs):
+    # Pippenger 桶方法: 指数按 c 位窗口切分，每个窗口把底数乘进对应数字的桶，
+    # 再用后缀积一次算出 Π_k bucket_k^k；总代价约 (b/c)·(N + 2^(c+1)) 次乘法 + b 次平方，
+    # 远少于逐项 pow 的 N·b 次。项数很少时退化为逐项 pow
+    pairs = [(int(c) % n_sq, int(w)) for c, w in pairs if int(w)]
+    if not pairs: return 1
+    if any(w < 0 for _, w in pairs): raise ValueError("指数必须为非负整数")
+    if len(pairs) < 8:
+        result = 1
+        for c, w in pairs: result = result * pow(c, w, n_sq) % n_sq
+        return result
+
+    bits = max(w.bit_length() for _, w in pairs)
+    c = min(range(1, 17), key=lambda c: -(-bits // c) * (len(pairs) + (2 << c)))
+    mask = (1 << c) - 1
+    result = None
+    for shift in range((-(-bits // c) - 1) * c, -1, -c):
+        if result is not None:
+            for _ in range(c): result = result * result % n_sq
+        buckets = [None] * (mask + 1)
+        for base, w in pairs:
+            d = (w >> shift) & mask
+            if d: buckets[d] = base if buckets[d] is None else buckets[d] * base % n_sq
+        running, acc = None, None
+        for k in range(mask, 0, -1):
+            if buckets[k] is not None: running = buckets[k] if running is None else running * buckets[k] % n_sq
+            if running is not None: acc = running if acc is None else acc * running % n_sq
+        if acc is not None: result = acc if result is None else result * acc % n_sq
+    return 1 if result is None else result
+
+
+def multi_exp(pub, ciphertexts, weights, chunk_size=8192, processes=1):
+    # 同态加权和 E(Σ w_i·m_i) = Π c_i^{w_i} mod n^2 (PIR 行内积、加权统计)。
+    # processes != 1 且项数超过一个 chunk 时，按 chunk 分到进程池各自做 Pippenger，再把部分积相乘
+    n = int(pub[0])
+    return _parallel_reduce(_multi_exp_mod, n * n, zip(ciphertexts, weights), chunk_size, processes)
+
+
+def _generate_factors(bit_length):
+    p = number.getPrime(bit_length // 2)
+    q = number.getPrime(bit_length // 2)
+    while q == p: q = number.getPrime(bit_length // 2)
+    return p, q
+
+
+class KeyPool:
+    # 预生成密钥对: 素数生成放在独立工作进程里，请求线程只取现成的 (p, q)。
+    # 池空时当场生成 (冷启动)，分别记录命中与冷启动的耗时。
+    # 进程池在首次 start()/take() 时才创建，避免在模块导入阶段派生子进程。
+    # randomness > 0 时每个密钥就绪即建好自己的 RandomnessPool 并在后台预计算 r^n (离线阶段)，
+    # take(with_pool=True) 连同这个已预热的池一起交出
+    def __init__(self, bit_length=128, size=4, processes=1, randomness=0):
+        self.bit_length = bit_length
+        self.size = max(1, size)
+        self.processes = processes
+        self.randomness = randomness
+        self.hits = 0
+        self.misses = 0
+        self._hit_ms = deque(maxlen=256)
+        self._cold_ms = deque(maxlen=256)
+        self._ready = deque()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def start(self):
+        with self._lock:
+            if self._executor is None: self._executor = ProcessPoolExecutor(max_workers=self.processes)
+            need = self.size - len(self._ready) - self._pending
+            self._pending += max(0, need)
+        for _ in range(need):
+            self._executor.submit(_generate_factors, self.bit_length).add_done_callback(self._on_ready)
+        return self
+
+    def _prepare(self, factors):
+        priv = PaillierPrivateKey(*factors)
+        pub = (priv.n, priv.n + 1)
+        return pub, priv, RandomnessPool(pub, size=self.randomness, priv=priv) if self.randomness else None
+
+    def _on_ready(self, fut):
+        entry = self._prepare(fut.result()) if fut.exception() is None else None
+        with self._lock:
+            self._pending -= 1
+            if entry is not None: self._ready.append(entry)
+
+    def take(self, with_pool=False):
+        start = time.perf_counter()
+        with self._lock:
+            entry = self._ready.popleft() if self._ready else None
+        hit = entry is not None
+        if not hit: entry = self._prepare(_generate_factors(self.bit_length))
+        pub, priv, pool = entry
+        elapsed = (time.perf_counter() - start) * 1000
+        with self._lock:
+            if hit:
+                self.hits += 1
+                self._hit_ms.append(elapsed)
+            else:
+                self.misses += 1
+                self._cold_ms.append(elapsed)
+        self.start()
+        if with_pool: return pub, priv, pool
+        if pool is not None: pool.close()
+        return pub, priv
+
+    def stats(self):
+        with self._lock:
+            return {"bit_length": self.bit_length, "hits": self.hits, "misses": self.misses,
+                    "available": len(self._ready), "pending": self._pending,
+                    "hit_ms_avg": sum(self._hit_ms) / len(self._hit_ms) if self._hit_ms else 0.0,
+                    "cold_ms_avg": sum(self._cold_ms) / len(self._cold_ms) if self._cold_ms else 0.0}
+
+
 class SimplePaillier:
     def __init__(self):
         self.n = None
@@ -9,25 +317,28 @@ class SimplePaillier:
         self.mu = None
 
     def generate_keys(self, bit_length=128):
-        p = number.getPrime(bit_length // 2)
-        q = number.getPrime(bit_length // 2)
-        self.n = p * q
+        priv = _key_from_factors(*_generate_factors(bit_length))
+        self.n = priv.n
         self.n_sq = self.n * self.n
         self.g = self.n + 1
-        self.lmb = (p - 1) * (q - 1)
-        self.mu = number.inverse(self.lmb, self.n)
-        return (self.n, self.g), (self.lmb, self.mu)
+        self.lmb, self.mu = priv[0], priv[1]
+        return (self.n, self.g), priv
 
     @staticmethod
-    def encrypt(pub, m):
+    def encrypt(pub, m, pool=None):
         n, g = pub
         n_sq = n * n
+        # g = n + 1 时 g^m ≡ 1 + m*n (mod n^2)，一次乘法代替模幂；其他 g 走通用路径
+        gm = (1 + m * n) % n_sq if g == n + 1 else pow(g, m, n_sq)
+        if pool is not None: return (gm * pool.take()) % n_sq
         r = random.randint(1, n - 1)
-        return (pow(g, m, n_sq) * pow(r, n, n_sq)) % n_sq
+        return (gm * pow(r, n, n_sq)) % n_sq
 
     @staticmethod
     def decrypt(priv, pub, c):
-        lmb, mu = priv
+        key = PaillierPrivateKey.load(priv, pub)
+        if key is not None: return key.decrypt(c)
+        lmb, mu = priv[0], priv[1]
         n, _ = pub
         n_sq = n * n
         x = pow(c, lmb, n_sq)
@@ -38,4 +349,41 @@ class SimplePaillier:
     def add(pub, c1, c2):
         n, _ = pub
         n_sq = n * n
-        return (c1 * c2) % n_sq
\ No newline at end of file
+        return (c1 * c2) % n_sq
+
+
+class PackedEncoder:
+    # 明文槽位打包: k 个有界非负整数 v_i < 2^value_bits 拼成一个明文 m = Σ v_i * 2^(i*w)。
+    # 槽宽 w 额外预留 additions.bit_length() 位，保证 additions 次同态相加后不会进位到相邻槽，
+    # 因此打包后的密文仍可直接用 SimplePaillier.add / sum_ciphertexts 做逐槽求和
+    def __init__(self, pub, value_bits=32, additions=1023):
+        self.pub = (int(pub[0]), int(pub[1]))
+        self.value_bits = value_bits
+        self.additions = additions
+        self.slot_bits = value_bits + additions.bit_length()
+        self.slots = (self.pub[0].bit_length() - 1) // self.slot_bits
+        if self.slots < 1: raise ValueError("公钥长度不足以容纳一个槽位")
+        self._mask = (1 << self.slot_bits) - 1
+
+    def pack(self, values):
+        values = list(values)
+        plaintexts = []
+        for i in range(0, len(values), self.slots):
+            m = 0
+            for v in reversed(values[i:i + self.slots]):
+                v = int(v)
+                if not 0 <= v < (1 << self.value_bits): raise ValueError(f"数值超出 {self.value_bits} 位槽位范围: {v}")
+                m = (m << self.slot_bits) | v
+            plaintexts.append(m)
+        return plaintexts
+
+    def unpack(self, m, count=None):
+        return [(m >> (i * self.slot_bits)) & self._mask for i in range(self.slots if count is None else count)]
+
+    def encrypt(self, values, pool=None):
+        return [SimplePaillier.encrypt(self.pub, m, pool=pool) for m in self.pack(values)]
+
+    def decrypt(self, priv, ciphertexts, count=None):
+        values = []
+        for c in ciphertexts: values.extend(self.unpack(SimplePaillier.decrypt(priv, self.pub, c)))
+        return values if count is None else values[:count]
@@ -0,0 +1,98 @@
+import hashlib
+import math
+import threading
+from core.paillier import SimplePaillier, multi_exp
+
+# 两维 PIR: N 条记录排成 rows × cols (≈ √N × √N) 矩阵。
+# 客户端只发送 cols 个加密选择子 q_j = E(1 if j == c else 0)，
+# 服务端对每一行计算 Π_j q_j^{d_ij} = E(d_ic) 并返回 rows 个密文；
+# 客户端解密第 r 行即得 d_rc，上下行通信量都是 O(√N)。
+
+# 用户目录每个槽位按 16 位通道存放用户名标签，6 个通道 (96 位) 在 128 位密钥下也放得进明文
+TAG_BITS = 16
+MAX_LANES = 6
+
+
+def matrix_shape(size):
+    cols = math.isqrt(max(size, 1) - 1) + 1
+    return -(-max(size, 1) // cols), cols
+
+
+def directory_slot(name, slots):
+    return int.from_bytes(hashlib.sha256(name.encode()).digest()[:8], 'big') % slots
+
+
+def build_query(pub, col, cols, pool=None):
+    return [SimplePaillier.encrypt(pub, 1 if j == col else 0, pool=pool) for j in range(cols)]
+
+
+def decode_answer(priv, pub, answers, row):
+    return SimplePaillier.decrypt(priv, pub, answers[row])
+
+
+class PIRDatabase:
+    def __init__(self, records=(), size=None):
+        records = list(records)
+        self.rows, self.cols = matrix_shape(max(size or 0, len(records)))
+        self.matrix = [[0] * self.cols for _ in range(self.rows)]
+        for i, v in enumerate(records): self.set(i, v)
+
+    @property
+    def size(self):
+        return self.rows * self.cols
+
+    def set(self, index, value):
+        r, c = divmod(index, self.cols)
+        self.matrix[r][c] = int(value)
+
+    def get(self, index):
+        r, c = divmod(index, self.cols)
+        return self.matrix[r][c]
+
+    def answer(self, pub, query):
+        if len(query) != self.cols: raise ValueError(f"查询向量长度应为 {self.cols}")
+        q = [int(c) for c in query]
+        # 每行是一次多重幂 Π_j q_j^{d_ij}，d_ij = 0 的项在 multi_exp 内跳过
+        return [multi_exp(pub, q, row) for row in self.matrix]
+
+
+class PIRDirectory(PIRDatabase):
+    # 成员查询: 用户名哈希到 slots 个槽位 (取用户数的 load 倍)，槽位里存该用户名的 16 位标签，
+    # 同槽的多个用户各占一个 16 位通道。客户端用 directory_slot(name, size) 自行算出行列，
+    # 解密后由 directory_match 检查是否含有自己的标签，误报率约为 2^-16 而不是 1/load。
+    # add 对槽位是读-改-写，由锁串行化，可被多个连接线程并发调用。
+    # 建表时按 headroom 倍用户数预留槽位，用户数翻倍 (越过 load) 才需要重建，重建摊还为 O(1)
+    def __init__(self, names=(), load=4, min_size=16, headroom=2):
+        names = list(names)
+        self._lock = threading.Lock()
+        size = max(min_size, load * headroom * len(names))
+        while True:
+            super().__init__(size=size)
+            self.load = load
+            self.count = len(names)
+            if all(self._insert(name) for name in names): break
+            size *= 2
+
+    def _insert(self, name):
+        index = directory_slot(name, self.size)
+        value = self.get(index)
+        lanes = (value.bit_length() + TAG_BITS - 1) // TAG_BITS
+        if lanes >= MAX_LANES: return False
+        self.set(index, value | directory_tag(name) << (lanes * TAG_BITS))
+        return True
+
+    def add(self, name):
+        # 返回 False 表示槽位已满或超过设计负载，调用方应按新的用户数重建
+        with self._lock:
+            self.count += 1
+            return self._insert(name) and self.count * self.load <= self.size
+
+
+def directory_tag(name):
+    return int.from_bytes(hashlib.sha256(name.encode()).digest()[8:10], 'big') or 1
+
+
+def directory_match(value, name):
+    tag = directory_tag(name)
+    mask = (1 << TAG_BITS) - 1
+    return any((value >> (i * TAG_BITS)) & mask == tag for i in range(MAX_LANES))
@@ -1,7 +1,81 @@
 import hashlib
+import hmac
+import re
+import unicodedata
+from bisect import bisect_left
+
+# 中日韩文字 (汉字、假名、谚文) 没有空格分词，连续段落切成二元组 (bigram)
+CJK_CHARS = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"
+_CJK_RE = re.compile(f"[{CJK_CHARS}]")
+
+STOP_WORDS = frozenset("""
+a an and are as at be but by for from has have i if in is it its me my no not of on or our so that the their them then
+there these they this to us was we were what when which who will with you your
+的 了 是 在 和 也 就 都 而 及 与 着 或 之 于 把 被 让 给 吗 呢 吧 啊 呀 哦 嗯 个 这 那
+""".split())
 
 def generate_trapdoor(keyword):
     return hashlib.sha256(keyword.encode()).hexdigest()
 
+def generate_trapdoors(tokens, key=None):
+    # 批量生成陷门: 无 key 时为 SHA-256 (桌面客户端)，有 key 时为 HMAC-SHA256 (网页端以房间名为 key)，
+    # 预先初始化的 HMAC 对象逐个 copy，省去每个词重复处理 key
+    if key is None: return [hashlib.sha256(t.encode()).hexdigest() for t in tokens]
+    base = hmac.new(key.encode() if isinstance(key, str) else key, digestmod=hashlib.sha256)
+    out = []
+    for t in tokens:
+        h = base.copy()
+        h.update(t.encode())
+        out.append(h.hexdigest())
+    return out
+
+def normalize_text(text):
+    # 全角/兼容字符归一 (NFKC) + 小写。用 lower 而不是 casefold: 网页端只有 toLowerCase，两端陷门必须一致
+    return unicodedata.normalize('NFKC', text).lower()
+
+def _runs(text):
+    # 切出中日韩连续段与字母数字连续段 (Unicode 类别 L* / N*，即网页端的 [\p{L}\p{N}])，其余字符都是分隔符
+    run, kind = [], None
+    for ch in text:
+        k = 'cjk' if _CJK_RE.match(ch) else 'word' if unicodedata.category(ch)[0] in 'LN' else None
+        if k != kind:
+            if run: yield ''.join(run)
+            run, kind = [], k
+        if k: run.append(ch)
+    if run: yield ''.join(run)
+
+def tokenize(text, query=False):
+    # 归一化后按 "中日韩连续段 / 字母数字连续段" 切分，标点与空白直接丢弃；结果去重并保持顺序。
+    # 规则与 templates/chat.html 的 tokenize 逐条对应 (tests/test_tokenize.py 用同一组样例核对两端)
+    # 字母数字段整体作为一个词并过滤停用词；中日韩段切成二元组，建索引时另外收录单字 (停用字除外)
+    # 以便单字查询，查询时长度 >= 2 的段只需二元组
+    tokens = {}
+    for run in _runs(normalize_text(text)):
+        if not _CJK_RE.match(run):
+            if run not in STOP_WORDS: tokens[run] = None
+            continue
+        if len(run) == 1 or not query:
+            for ch in run:
+                if ch not in STOP_WORDS: tokens[ch] = None
+        for i in range(len(run) - 1): tokens[run[i:i + 2]] = None
+    return list(tokens)
+
 def extract_keywords(text):
-    return text.split()
\ No newline at end of file
+    return tokenize(text)
+
+def merge_postings(postings, mode='and'):
+    # postings 为若干升序消息 id 序列；OR 取并集，AND 从最短的表开始求交、遇空即停。
+    # 候选远少于下一张表时在表里逐个二分确认，否则交给 set 在 C 层求交
+    if not postings: return []
+    if mode == 'or': return sorted(set().union(*postings))
+    postings = sorted(postings, key=len)
+    result = list(postings[0])
+    for plist in postings[1:]:
+        if not result: break
+        if len(result) * 32 < len(plist): result = [x for x in result if contains_posting(plist, x)]
+        else: result = sorted(set(result).intersection(plist))
+    return result
+
+def contains_posting(plist, x):
+    i = bisect_left(plist, x)
+    return i < len(plist) and plist[i] == x
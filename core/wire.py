@@ -0,0 +1,149 @@
+import base64
+import codecs
+import hashlib
+import json
+import re
+from core.paillier import PaillierPrivateKey
+
+
+class JSONReader:
+    # 裸 TCP 没有分帧: 一个大 JSON 可能被拆成多次 recv，连续的小 JSON 也可能粘在一起。
+    # 这里累积缓冲区并用 raw_decode 逐个切出完整文档；缓冲区超过 max_size 仍无法解析则视为坏数据
+    def __init__(self, sock, bufsize=65536, max_size=64 * 1024 * 1024):
+        self.sock = sock
+        self.bufsize = bufsize
+        self.max_size = max_size
+        self.buf = ''
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+
+    def read(self):
+        while True:
+            self.buf = self.buf.lstrip()
+            if self.buf:
+                try:
+                    obj, end = self._decoder.raw_decode(self.buf)
+                    self.buf = self.buf[end:]
+                    return obj
+                except json.JSONDecodeError as e:
+                    if len(self.buf) > self.max_size: raise
+                    if not _truncated(e):
+                        # 坏数据而非半截文档: 丢到下一个 '{' 处重新同步，再抛给调用方跳过
+                        start = self.buf.find('{', e.pos + 1)
+                        self.buf = self.buf[start:] if start >= 0 else ''
+                        raise
+            chunk = self.sock.recv(self.bufsize)
+            if not chunk: return None
+            self.buf += self._utf8.decode(chunk)
+
+
+# 出错位置之后只剩这些内容时，文档可能只是还没收全: 字面量 / 数字的小数或指数部分 / \uXXXX 转义的前缀
+_PARTIAL_TAIL = re.compile(r'\.|[eE][-+]?|u[0-9a-fA-F]{0,3}')
+_LITERALS = ('true', 'false', 'null', 'NaN', 'Infinity', '-Infinity')
+
+
+def _truncated(err):
+    tail = err.doc[err.pos:]
+    if not tail or err.msg.startswith('Unterminated string'): return True
+    return any(lit.startswith(tail) for lit in _LITERALS) or _PARTIAL_TAIL.fullmatch(tail) is not None
+
+
+# --- Paillier 密文 / 密钥的紧凑二进制编码 ---
+# 格式: version(1) | kind(1) | 公钥指纹(8) | 定宽大端整数...，放进 JSON 时用无填充 base64url。
+# 一个向量共用一个头部，每个密文占 n^2 的字节宽度；十进制 JSON 整数 (旧格式) 依旧可解码。
+# 连接双方通过 HELLO / codec 字段协商是否在响应中使用该格式
+BINARY_CODEC = "bin1"
+CODEC_VERSION = 1
+KIND_CIPHERTEXTS, KIND_PUBLIC_KEY, KIND_PRIVATE_KEY = 1, 2, 3
+
+
+def _b64e(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def _b64d(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _int_bytes(x, width=None):
+    return x.to_bytes(width or (x.bit_length() + 7) // 8 or 1, 'big')
+
+
+def key_fingerprint(pub):
+    return hashlib.sha256(_int_bytes(int(pub[0]))).digest()[:8]
+
+
+def _pack(kind, pub, payload):
+    return _b64e(bytes([CODEC_VERSION, kind]) + key_fingerprint(pub) + payload)
+
+
+def _unpack(text, kind, pub=None):
+    raw = _b64d(text)
+    if len(raw) < 10 or raw[0] != CODEC_VERSION or raw[1] != kind: raise ValueError("未知的编码版本或类型")
+    if pub is not None and raw[2:10] != key_fingerprint(pub): raise ValueError("公钥指纹不匹配")
+    return raw[10:]
+
+
+def negotiate_codec(offered):
+    return BINARY_CODEC if offered and BINARY_CODEC in offered else None
+
+
+def encode_ciphertexts(pub, ciphertexts):
+    n = int(pub[0])
+    width = ((n * n).bit_length() + 7) // 8
+    return _pack(KIND_CIPHERTEXTS, pub, b''.join(int(c).to_bytes(width, 'big') for c in ciphertexts))
+
+
+def decode_ciphertexts(pub, value):
+    if isinstance(value, str) and not value.isdigit():
+        n = int(pub[0])
+        width = ((n * n).bit_length() + 7) // 8
+        raw = _unpack(value, KIND_CIPHERTEXTS, pub)
+        if len(raw) % width: raise ValueError("密文长度与公钥不符")
+        return [int.from_bytes(raw[i:i + width], 'big') for i in range(0, len(raw), width)]
+    if isinstance(value, (list, tuple)): return [decode_ciphertext(pub, v) for v in value]
+    return [int(value)]
+
+
+def encode_ciphertext(pub, c):
+    return encode_ciphertexts(pub, [c])
+
+
+def decode_ciphertext(pub, value):
+    values = decode_ciphertexts(pub, value)
+    if len(values) != 1: raise ValueError("应为单个密文")
+    return values[0]
+
+
+def encode_public_key(pub):
+    n, g = int(pub[0]), int(pub[1])
+    # g = n + 1 (本项目生成的密钥) 时省略 g
+    payload = _int_bytes(n) if g == n + 1 else len(_int_bytes(n)).to_bytes(2, 'big') + _int_bytes(n) + _int_bytes(g)
+    return _b64e(bytes([CODEC_VERSION, KIND_PUBLIC_KEY, 0 if g == n + 1 else 1]) + payload)
+
+
+def decode_public_key(value):
+    if isinstance(value, dict): value = (value['n'], value.get('g') or int(value['n']) + 1)
+    if not isinstance(value, str): return (int(value[0]), int(value[1]))
+    raw = _b64d(value)
+    if len(raw) < 4 or raw[0] != CODEC_VERSION or raw[1] != KIND_PUBLIC_KEY: raise ValueError("未知的编码版本或类型")
+    if raw[2] == 0:
+        n = int.from_bytes(raw[3:], 'big')
+        return (n, n + 1)
+    size = int.from_bytes(raw[3:5], 'big')
+    return (int.from_bytes(raw[5:5 + size], 'big'), int.from_bytes(raw[5 + size:], 'big'))
+
+
+def encode_private_key(pub, priv):
+    key = PaillierPrivateKey.load(priv, pub)
+    # 二进制格式只存 p, q，需要 g = n + 1 才能还原出私钥
+    if key is None: raise ValueError("二进制私钥编码仅支持 g = n + 1 的密钥")
+    p = _int_bytes(key.p)
+    return _pack(KIND_PRIVATE_KEY, pub, len(p).to_bytes(2, 'big') + p + _int_bytes(key.q))
+
+
+def decode_private_key(pub, value):
+    if not isinstance(value, str): return PaillierPrivateKey.load(value, pub) or value
+    raw = _unpack(value, KIND_PRIVATE_KEY, pub)
+    size = int.from_bytes(raw[:2], 'big')
+    return PaillierPrivateKey.load((0, 0, int.from_bytes(raw[2:2 + size], 'big'), int.from_bytes(raw[2 + size:], 'big')), pub)
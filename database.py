@@ -1,20 +1,124 @@
+import atexit
+import base64
 import sqlite3
 import os
 import time
+import threading
 import hashlib
 import hmac
+import queue
+import tempfile
+from array import array
+from bisect import bisect_left
+from concurrent.futures import Future
+from contextlib import contextmanager
+from core.bloom import ScalableBloomFilter, dump_filters, load_filters
+from core.cache import LRUCache
+from core.crypto_utils import ciphertext_bytes
+from core.sse_utils import merge_postings
+
+class ConnectionPool:
+    # 一个写连接 + 至多 readers 个空闲读连接，WAL 模式下读写互不阻塞。
+    # 写连接由 RLock 串行化，writer() 可嵌套，最外层正常退出时提交、异常时回滚；
+    # 读连接按需创建，用完放回空闲栈，超出 readers 的直接关闭，所以取读连接从不等待
+    def __init__(self, path, readers=4, mmap_size=256 * 1024 * 1024, cache_kb=16 * 1024, busy_timeout_ms=5000):
+        self.path = path
+        self.readers = readers
+        self.mmap_size = mmap_size
+        self.cache_kb = cache_kb
+        self.busy_timeout_ms = busy_timeout_ms
+        self.opened = 0
+        self.conn = self._connect()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self._write_lock = threading.RLock()
+        self._depth = 0
+        self._idle = []
+        self._idle_lock = threading.Lock()
+
+    def _connect(self, readonly=False):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, check_same_thread=False)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        # 负数表示以 KiB 为单位
+        conn.execute(f"PRAGMA cache_size={-int(self.cache_kb)}")
+        if readonly: conn.execute("PRAGMA query_only=ON")
+        self.opened += 1
+        return conn
+
+    @contextmanager
+    def writer(self):
+        with self._write_lock:
+            self._depth += 1
+            try:
+                yield self.conn
+                if self._depth == 1: self.conn.commit()
+            except BaseException:
+                if self._depth == 1: self.conn.rollback()
+                raise
+            finally:
+                self._depth -= 1
+
+    @contextmanager
+    def reader(self):
+        with self._idle_lock: conn = self._idle.pop() if self._idle else None
+        if conn is None: conn = self._connect(readonly=True)
+        try:
+            yield conn
+        finally:
+            with self._idle_lock:
+                keep = len(self._idle) < self.readers
+                if keep: self._idle.append(conn)
+            if not keep: conn.close()
+
+    def close(self):
+        with self._idle_lock: idle, self._idle = self._idle, []
+        for conn in idle: conn.close()
+        with self._write_lock: self.conn.close()
+
+    def stats(self):
+        return {"readers": self.readers, "idle": len(self._idle), "opened": self.opened}
+
 
 class DatabaseManager:
-    def __init__(self, db_path):
+    def __init__(self, db_path, search_cache_bytes=16 * 1024 * 1024, migrate=True, sqlite=None, group_commit=None, sleep=None):
         folder = os.path.dirname(db_path)
         # 强制使用 final 数据库
         new_db_path = os.path.join(folder, 'secure_chat_final.db')
         os.makedirs(folder, exist_ok=True)
-        self.conn = sqlite3.connect(new_db_path, check_same_thread=False)
+        # sqlite 为 config.json 中的连接池参数 (readers / mmap_size / cache_kb / busy_timeout_ms)；
+        # self.conn 即写连接。self.lock 只保护内存中的过滤器、缓存与房间写入版本
+        self.pool = ConnectionPool(new_db_path, **(sqlite or {}))
+        self.conn = self.pool.conn
+        self.lock = threading.RLock()
+        self.room_epochs = {}
         self.create_tables()
+        # (room, trapdoor) -> 本房间该陷门的消息 id 升序数组；单个倒排表超过缓存的 1/16 时不缓存，退回 SQL
+        self.search_cache = LRUCache(search_cache_bytes)
+        self.search_cache_max_postings = search_cache_bytes // 64
+        # 已知过长的 (room, trapdoor)，直接走 SQL。倒排表只增不减，标记不会过期；
+        # 条目数不超过索引行数 / search_cache_max_postings
+        self.search_oversized = set()
+        # 每个房间一个陷门布隆过滤器，持久化在数据库旁的 .bloom 文件中
+        self.bloom_path = new_db_path + '.bloom'
+        self.bloom_flush_every = 256
+        self.load_blooms()
+        atexit.register(self.flush_blooms)
+        # group_commit 为组提交参数 (max_batch / max_ms)，max_batch 为 0 时每次写入单独提交；
+        # sleep 为等待写入结果时的让出函数，eventlet 下传 socketio.sleep
+        opts = group_commit or {}
+        self.group_commit_max = opts.get('max_batch', 256)
+        self.group_commit_ms = opts.get('max_ms', 2)
+        self.sleep = sleep
+        self.write_batches = self.write_ops = self.write_max_batch = 0
+        self.write_queue = None
+        self.write_gate = threading.Lock()  # 入队与关闭写线程互斥，关闭后新的写操作改走同步路径
+        if self.group_commit_max > 0: self.start_writer()
+        if migrate: self.start_blob_migration()
 
     def create_tables(self):
-        cursor = self.conn.cursor()
+        with self.pool.writer() as conn: self._create_tables(conn.cursor())
+
+    def _create_tables(self, cursor):
         cursor.execute('''CREATE TABLE IF NOT EXISTS users (
             username TEXT PRIMARY KEY, password_hash BLOB, salt BLOB,
             nickname TEXT, signature TEXT, avatar_color TEXT
@@ -27,113 +131,458 @@ class DatabaseManager:
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             room TEXT,
             sender TEXT,
-            content_enc TEXT,
+            content_enc BLOB,
             msg_type TEXT DEFAULT 'text',
             file_name TEXT,
             timestamp REAL
         )''')
         cursor.execute('''CREATE TABLE IF NOT EXISTS search_index (
             trapdoor TEXT,
-            message_id INTEGER
+            message_id INTEGER,
+            PRIMARY KEY (trapdoor, message_id)
+        ) WITHOUT ROWID''')
+        self.migrate_search_index(cursor)
+        # 房间内按时间取历史消息
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_room_ts ON messages (room, timestamp)")
+        # 同态累加器: 每个 (公钥 n, 分组) 一行，enc_sum 为十进制密文 (超出 SQLite 整数范围)
+        cursor.execute('''CREATE TABLE IF NOT EXISTS salary_aggregates (
+            key_n TEXT,
+            grp TEXT DEFAULT '',
+            enc_sum TEXT,
+            count INTEGER,
+            PRIMARY KEY (key_n, grp)
         )''')
-        self.conn.commit()
+        cursor.execute("CREATE TABLE IF NOT EXISTS schema_meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def migrate_search_index(self, cursor):
+        # 旧版 search_index 没有主键和索引，每次搜索都全表扫描，且允许重复陷门；
+        # 迁移为 (trapdoor, message_id) 主键的 WITHOUT ROWID 表并顺带去重
+        row = cursor.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='search_index'").fetchone()
+        if not row or 'WITHOUT ROWID' in row[0].upper(): return
+        cursor.execute("DROP TABLE IF EXISTS search_index_v2")
+        cursor.execute('''CREATE TABLE search_index_v2 (
+            trapdoor TEXT,
+            message_id INTEGER,
+            PRIMARY KEY (trapdoor, message_id)
+        ) WITHOUT ROWID''')
+        cursor.execute("INSERT OR IGNORE INTO search_index_v2 (trapdoor, message_id) SELECT trapdoor, message_id FROM search_index")
+        cursor.execute("DROP TABLE search_index")
+        cursor.execute("ALTER TABLE search_index_v2 RENAME TO search_index")
+
+    # --- 密文 BLOB 迁移 ---
+    # 旧库的 content_enc 是 base64 文本 (多 33% 体积，读写都要编解码)。按 id 分批就地改写成原始 IV||密文，
+    # 每批一个短事务后释放锁并稍作停顿，不阻塞写入；进度记在 schema_meta，中断后从断点继续。
+    # 新写入的消息本身就是 BLOB，不是合法密文 base64 的旧数据原样保留
+    def migrate_content_blobs(self, batch=500, pause=0.01):
+        last, converted = self._blob_checkpoint(), 0
+        while True:
+            with self.pool.writer() as conn:
+                cursor = conn.cursor()
+                rows = cursor.execute("SELECT id, content_enc FROM messages WHERE id > ? ORDER BY id LIMIT ?", (last, batch)).fetchall()
+                if not rows: break
+                updates = []
+                for mid, value in rows:
+                    blob = _blob_from_text(value) if isinstance(value, str) else None
+                    if blob is not None: updates.append((blob, mid))
+                cursor.executemany("UPDATE messages SET content_enc=? WHERE id=?", updates)
+                last = rows[-1][0]
+                cursor.execute("INSERT OR REPLACE INTO schema_meta (key, value) VALUES ('blob_migration', ?)", (str(last),))
+            converted += len(updates)
+            if pause: time.sleep(pause)
+        return converted
+
+    def _blob_checkpoint(self):
+        with self.pool.reader() as conn: row = conn.execute("SELECT value FROM schema_meta WHERE key='blob_migration'").fetchone()
+        return int(row[0]) if row else 0
+
+    def start_blob_migration(self):
+        # 断点之后还有文本密文时才起后台线程
+        checkpoint = self._blob_checkpoint()
+        with self.pool.reader() as conn:
+            row = conn.execute("SELECT 1 FROM messages WHERE id > ? AND typeof(content_enc) = 'text' LIMIT 1", (checkpoint,)).fetchone()
+        if not row: return None
+        t = threading.Thread(target=self.migrate_content_blobs, daemon=True)
+        t.start()
+        return t
+
+    # --- 房间布隆过滤器 ---
+    # 大多数搜索的关键词在所选房间里根本不存在；过滤器判定 "一定不存在" 时直接返回，不再做 search_index ⋈ messages。
+    # 文件里记录已纳入的最大 message_id，启动时只补录其后的陷门，所以崩溃或未保存只会多一次补录，不会漏报。
+    # 补录不到的旧 id (add_search_index 给已有消息补陷门) 在 _index_committed 里立即落盘
+    def load_blooms(self):
+        self.blooms, self.bloom_high_water, self.bloom_dirty = {}, 0, 0
+        self.bloom_checks = self.bloom_skips = self.bloom_passed_empty = 0
+        if os.path.exists(self.bloom_path):
+            try:
+                with open(self.bloom_path, 'rb') as f: self.blooms, self.bloom_high_water = load_filters(f.read())
+            except (ValueError, OSError) as e:
+                print(f"[DB] 布隆过滤器文件损坏，重建: {e}")
+                self.blooms, self.bloom_high_water = {}, 0
+        self.bloom_saved_high_water = self.bloom_high_water
+        with self.pool.reader() as conn:
+            latest = conn.execute("SELECT MAX(id) FROM messages").fetchone()[0] or 0
+            if latest <= self.bloom_high_water: return
+            cursor = conn.execute('''SELECT m.room, i.trapdoor FROM search_index i JOIN messages m ON m.id = i.message_id
+                                     WHERE i.message_id > ?''', (self.bloom_high_water,))
+            for room, trapdoor in cursor: self.room_bloom(room).add(trapdoor)
+        self.bloom_high_water = latest
+        self.save_blooms()
+
+    def room_bloom(self, room):
+        bf = self.blooms.get(room)
+        if bf is None: bf = self.blooms[room] = ScalableBloomFilter()
+        return bf
+
+    def save_blooms(self):
+        with self.lock:
+            raw = dump_filters(self.blooms, self.bloom_high_water)
+            self.bloom_saved_high_water = self.bloom_high_water
+            self.bloom_dirty = 0
+        # app.py 与 chat_server 共用同一数据库，临时文件按进程各取一个，避免互相覆盖写到一半的文件
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.bloom_path) or '.', prefix=os.path.basename(self.bloom_path) + '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f: f.write(raw)
+            os.replace(tmp, self.bloom_path)
+        except OSError:
+            os.unlink(tmp)
+            raise
+
+    def flush_blooms(self):
+        if self.bloom_dirty: self.save_blooms()
+
+    def close(self):
+        self.stop_writer()
+        self.flush_blooms()
+        self.pool.close()
+
+    def bloom_stats(self):
+        with self.lock:
+            return {
+                "rooms": len(self.blooms),
+                "trapdoors": sum(len(bf) for bf in self.blooms.values()),
+                "bytes": sum(bf.nbytes for bf in self.blooms.values()),
+                "est_fp_rate": max((bf.estimated_fp_rate() for bf in self.blooms.values()), default=0.0),
+                "checks": self.bloom_checks,
+                "skipped": self.bloom_skips,
+                # 通过了过滤器但结果为空的查询 (误判的上界)
+                "passed_empty": self.bloom_passed_empty,
+            }
+
+    # --- 组提交写队列 ---
+    # 消息与陷门的写入交给后台写线程: 调用方入队后等待 Future，写线程一次取出队列中已有的写操作
+    # (至多 group_commit_max 个、group_commit_ms 毫秒)，在同一事务里执行后只提交一次。
+    # 队列一空就立即提交，单个发送者不额外等待；负载越高每批越大。
+    # 写操作 fn(conn, *args) 返回 (结果, 提交后回调)，回调在提交后、Future 完成前执行
+    def start_writer(self):
+        self.write_queue = queue.Queue()
+        self.writer_thread = threading.Thread(target=self._write_loop, args=(self.write_queue,), daemon=True)
+        self.writer_thread.start()
+        atexit.register(self.stop_writer)
+
+    def stop_writer(self):
+        # 先把调用方切回同步路径再放哨兵，哨兵之后不会再有写操作入队；写线程处理完已入队的操作后退出
+        with self.write_gate:
+            q, self.write_queue = self.write_queue, None
+            if q is None: return
+            q.put(None)
+        self.writer_thread.join()
+
+    def _write(self, fn, *args):
+        fut = Future()
+        with self.write_gate:
+            q = self.write_queue
+            if q is not None: q.put((fn, args, fut))
+        if q is None:
+            with self.pool.writer() as conn: result, after = fn(conn, *args)
+            if after: after()
+            return result
+        if self.sleep is not None:
+            while not fut.done(): self.sleep(0.001)
+        return fut.result()
+
+    def _write_loop(self, q):
+        while True:
+            item = q.get()
+            if item is None: return
+            batch, stop = [item], False
+            deadline = time.monotonic() + self.group_commit_ms / 1000
+            while len(batch) < self.group_commit_max and time.monotonic() < deadline:
+                try: item = q.get_nowait()
+                except queue.Empty: break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._commit_batch(batch)
+            if stop: return
+
+    def _commit_batch(self, batch):
+        try:
+            with self.pool.writer() as conn: results = [fn(conn, *args) for fn, args, _ in batch]
+        except Exception:
+            # 整批已回滚，逐条单独重做，只让出错的那条失败
+            for fn, args, fut in batch:
+                try:
+                    with self.pool.writer() as conn: result, after = fn(conn, *args)
+                except Exception as e:
+                    fut.set_exception(e)
+                    continue
+                _finish(fut, result, after)
+        else:
+            for (_, _, fut), (result, after) in zip(batch, results): _finish(fut, result, after)
+        with self.lock:
+            self.write_batches += 1
+            self.write_ops += len(batch)
+            self.write_max_batch = max(self.write_max_batch, len(batch))
+
+    def write_stats(self):
+        q = self.write_queue
+        with self.lock:
+            return {"group_commit": q is not None, "queued": q.qsize() if q else 0,
+                    "batches": self.write_batches, "ops": self.write_ops, "max_batch": self.write_max_batch,
+                    "avg_batch": self.write_ops / self.write_batches if self.write_batches else 0.0}
 
     # --- SSE 搜索核心逻辑 ---
-    def add_search_index(self, message_id, trapdoors):
-            if not trapdoors: return
-            cursor = self.conn.cursor()
+    def add_search_index(self, message_id, trapdoors, room=None):
+        if not trapdoors: return
+        # 直接存入前端传来的哈希值；同一消息内的重复陷门先去重，重复提交由主键冲突忽略
+        self._write(self._write_index, message_id, set(trapdoors), room)
+
+    def _write_index(self, conn, message_id, trapdoors, room):
+        room = self._insert_index(conn, message_id, trapdoors, room)
+        return None, lambda: self._index_committed(message_id, trapdoors, room)
+
+    def _insert_index(self, conn, message_id, trapdoors, room):
+        conn.executemany("INSERT OR IGNORE INTO search_index (trapdoor, message_id) VALUES (?, ?)",
+                         [(trapdoor, message_id) for trapdoor in trapdoors])
+        if room is None:
+            row = conn.execute("SELECT room FROM messages WHERE id=?", (message_id,)).fetchone()
+            room = row[0] if row else None
+        return room
+
+    def _index_committed(self, message_id, trapdoors, room):
+        # 提交之后才更新过滤器与缓存，并推进房间写入版本 (见 room_postings)
+        if room is None: return
+        with self.lock:
+            self.room_epochs[room] = self.room_epochs.get(room, 0) + 1
+            bf = self.room_bloom(room)
             for trapdoor in trapdoors:
-                # 直接存入前端传来的哈希值
-                cursor.execute("INSERT INTO search_index (trapdoor, message_id) VALUES (?, ?)", (trapdoor, message_id))
-            self.conn.commit()
+                bf.add(trapdoor)
+                # 已缓存的倒排表就地追加新 id，而不是整体失效
+                self.search_cache.update((room, trapdoor), lambda ids: _insert_posting(ids, message_id))
+            self.bloom_high_water = max(self.bloom_high_water, message_id)
+            self.bloom_dirty += 1
+            flush = self.bloom_dirty >= self.bloom_flush_every or message_id <= self.bloom_saved_high_water
+        if flush: self.save_blooms()
     # [关键修改] 返回 ID
-    def search_encrypted(self, query_trapdoor, room):
-        cursor = self.conn.cursor()
-        sql = """
+    def search_encrypted(self, query_trapdoors, room, mode='and', limit=None, before=None):
+        # 多关键词检索 (兼容单个陷门字符串)，结果按消息 id 倒序，limit 为页大小，
+        # before 为上一页最后一条的 (timestamp, id) 游标，只按其中的 id 翻页。
+        # 倒排缓存与 SQL 两条路径用同一个游标定义，相邻两页落在不同路径上也不会漏行或重行
+        trapdoors = list(dict.fromkeys(td for td in ([query_trapdoors] if isinstance(query_trapdoors, str) else query_trapdoors) if td))
+        if not trapdoors: return []
+        # 布隆过滤器: AND 中任一陷门一定不存在即为空；OR 只保留可能存在的陷门
+        with self.lock:
+            bf = self.blooms.get(room)
+            self.bloom_checks += 1
+            present = [td for td in trapdoors if bf is not None and td in bf]
+            if len(present) < len(trapdoors) and (mode != 'or' or not present):
+                self.bloom_skips += 1
+                return []
+        trapdoors = present
+        postings = self.room_postings(trapdoors, room)
+        if postings is None:
+            rows = self._search_sql(trapdoors, room, mode, limit, before)
+        else:
+            # 按 id 翻页后只按主键回表取这一页
+            ids = merge_postings(postings, mode)
+            if before: ids = ids[:bisect_left(ids, before[1])]
+            rows = self._fetch_messages(ids[::-1][:limit] if limit else ids[::-1])
+        if not rows and not before: self.bloom_passed_empty += 1
+        return [{"id": r[0], "sender": r[1], "content_enc": r[2], "msg_type": r[3], "file_name": r[4], "timestamp": r[5]} for r in rows]
+
+    def room_postings(self, trapdoors, room):
+        # 各陷门在本房间的倒排表，优先取 LRU；有任一表过长不宜缓存时返回 None
+        postings = []
+        for td in trapdoors:
+            if (room, td) in self.search_oversized: return None
+            ids = self.search_cache.get((room, td))
+            if ids is None:
+                # 读库不持锁。读之前记下房间写入版本，读完若期间有新消息提交并已更新缓存，
+                # 本次结果 (读快照可能不含该消息) 就不放入缓存；之后才提交的消息会由 _index_committed 就地追加
+                with self.lock: epoch = self.room_epochs.get(room, 0)
+                with self.pool.reader() as conn:
+                    rows = conn.execute("SELECT i.message_id FROM search_index i JOIN messages m ON m.id = i.message_id "
+                                        "WHERE i.trapdoor = ? AND m.room = ? ORDER BY i.message_id LIMIT ?",
+                                        (td, room, self.search_cache_max_postings + 1)).fetchall()
+                if len(rows) > self.search_cache_max_postings:
+                    with self.lock: self.search_oversized.add((room, td))
+                    return None
+                ids = array('I', (r[0] for r in rows))
+                with self.lock:
+                    if self.room_epochs.get(room, 0) == epoch: self.search_cache.put((room, td), ids)
+            postings.append(ids)
+        return postings
+
+    def _fetch_messages(self, ids, chunk=500):
+        rows = []
+        with self.pool.reader() as conn:
+            for i in range(0, len(ids), chunk):
+                part = ids[i:i + chunk]
+                rows.extend(conn.execute(f"SELECT id, sender, content_enc, msg_type, file_name, timestamp FROM messages WHERE id IN ({','.join('?' * len(part))}) ORDER BY id DESC", part).fetchall())
+        return rows
+
+    def _search_sql(self, trapdoors, room, mode, limit, before):
+        with self.pool.reader() as conn: return self._search_sql_rows(conn.cursor(), trapdoors, room, mode, limit, before)
+
+    def _search_sql_rows(self, cursor, trapdoors, room, mode, limit, before):
+        # 倒排表运算在 search_index 上完成，房间在子查询里就回表过滤，id 游标直接作用于主键 (trapdoor, message_id)，
+        # 翻页时只对游标之前的倒排项做探测，不必每页重算整个命中集合。
+        # AND 按倒排表长度从最稀有的陷门出发，其余陷门用主键 (trapdoor, message_id) 逐条探测；OR 直接取并集
+        alias = 'i' if mode == 'or' else 'i0'
+        scope = " AND mm.room = ?" + (f" AND {alias}.message_id < ?" if before else "")
+        scope_args = (room, before[1]) if before else (room,)
+        if mode == 'or':
+            ids_sql = f"SELECT i.message_id FROM search_index i JOIN messages mm ON mm.id = i.message_id WHERE i.trapdoor IN ({','.join('?' * len(trapdoors))}){scope}"
+            ids_args = (*trapdoors, *scope_args)
+        else:
+            if len(trapdoors) > 1:
+                cursor.execute(f"SELECT trapdoor, COUNT(*) FROM search_index WHERE trapdoor IN ({','.join('?' * len(trapdoors))}) GROUP BY trapdoor", trapdoors)
+                counts = dict(cursor.fetchall())
+                if len(counts) < len(trapdoors): return []
+                trapdoors = sorted(trapdoors, key=counts.get)
+            ids_sql = f"SELECT i0.message_id FROM search_index i0 JOIN messages mm ON mm.id = i0.message_id WHERE i0.trapdoor = ?{scope}" + "".join(
+                " AND EXISTS (SELECT 1 FROM search_index i WHERE i.trapdoor = ? AND i.message_id = i0.message_id)" for _ in trapdoors[1:])
+            ids_args = (trapdoors[0], *scope_args, *trapdoors[1:])
+        sql = f"""
             SELECT m.id, m.sender, m.content_enc, m.msg_type, m.file_name, m.timestamp
             FROM messages m
-            JOIN search_index idx ON m.id = idx.message_id
-            WHERE idx.trapdoor = ? AND m.room = ?
-            ORDER BY m.timestamp DESC
+            WHERE m.id IN ({ids_sql})
+            ORDER BY m.id DESC{" LIMIT ?" if limit else ""}
         """
-        cursor.execute(sql, (query_trapdoor, room))
-        return [{"id": r[0], "sender": r[1], "content_enc": r[2], "msg_type": r[3], "file_name": r[4], "timestamp": r[5]} for r in cursor.fetchall()]
+        cursor.execute(sql, (*ids_args, *((limit,) if limit else ())))
+        return cursor.fetchall()
+
+    # --- 隐私薪资: 增量维护的加密累加器 ---
+    def add_salary_record(self, pub, enc_salary, group=None, count=1):
+        # O(1) 更新: 总体 ('') 与所属分组各乘一次 mod n^2，不保留单条记录；
+        # 打包密文一次携带多条薪资，由 count 给出条数。读-改-写在同一个写事务内
+        n = int(pub[0])
+        n_sq = n * n
+        groups = [''] if not group else ['', str(group)]
+        with self.pool.writer() as conn:
+            for grp in groups:
+                row = conn.execute("SELECT enc_sum, count FROM salary_aggregates WHERE key_n=? AND grp=?", (str(n), grp)).fetchone()
+                enc_sum, total = (int(row[0]) * int(enc_salary) % n_sq, row[1] + count) if row else (int(enc_salary) % n_sq, count)
+                conn.execute("INSERT OR REPLACE INTO salary_aggregates (key_n, grp, enc_sum, count) VALUES (?, ?, ?, ?)",
+                             (str(n), grp, str(enc_sum), total))
+
+    def get_salary_aggregate(self, pub, group=None):
+        with self.pool.reader() as conn:
+            row = conn.execute("SELECT enc_sum, count FROM salary_aggregates WHERE key_n=? AND grp=?", (str(int(pub[0])), str(group or ''))).fetchone()
+        return (int(row[0]), row[1]) if row else None
 
     # --- 常规数据库操作 ---
-    def store_message(self, room, sender, content_enc, msg_type='text', file_name=None):
-        cursor = self.conn.cursor()
-        cursor.execute("INSERT INTO messages (room, sender, content_enc, msg_type, file_name, timestamp) VALUES (?, ?, ?, ?, ?, ?)", 
-                       (room, sender, content_enc, msg_type, file_name, time.time()))
+    def store_message(self, room, sender, content_enc, msg_type='text', file_name=None, trapdoors=None):
+        # 消息与其陷门在同一事务里写入 (经组提交队列，与同批其它消息共用一次提交)
+        # 取时间戳与分配 id 都在写连接的锁内，新消息的 id 顺序即时间顺序 (搜索结果按 id 排序翻页)
+        # content_enc 以原始字节 BLOB 落库，仍兼容传入 base64 文本
+        return self._write(self._write_message, room, sender, ciphertext_bytes(content_enc), msg_type, file_name, set(trapdoors or ()))
+
+    def _write_message(self, conn, room, sender, content_enc, msg_type, file_name, trapdoors):
+        cursor = conn.execute("INSERT INTO messages (room, sender, content_enc, msg_type, file_name, timestamp) VALUES (?, ?, ?, ?, ?, ?)", 
+                              (room, sender, content_enc, msg_type, file_name, time.time()))
         msg_id = cursor.lastrowid
-        self.conn.commit()
-        return msg_id
+        if not trapdoors: return msg_id, None
+        self._insert_index(conn, msg_id, trapdoors, room)
+        return msg_id, lambda: self._index_committed(msg_id, trapdoors, room)
 
     # [关键修改] 返回 ID
     def get_room_history(self, room):
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT id, sender, content_enc, msg_type, file_name, timestamp FROM messages WHERE room=? ORDER BY timestamp ASC LIMIT 100", (room,))
-        return [{"id": r[0], "sender": r[1], "content_enc": r[2], "msg_type": r[3], "file_name": r[4], "timestamp": r[5]} for r in cursor.fetchall()]
+        with self.pool.reader() as conn:
+            rows = conn.execute("SELECT id, sender, content_enc, msg_type, file_name, timestamp FROM messages WHERE room=? ORDER BY timestamp ASC LIMIT 100", (room,)).fetchall()
+        return [{"id": r[0], "sender": r[1], "content_enc": r[2], "msg_type": r[3], "file_name": r[4], "timestamp": r[5]} for r in rows]
 
     # ... (用户/好友逻辑保持不变) ...
     def register_user(self, username, pwd_hash, salt):
         try:
-            cursor = self.conn.cursor()
-            cursor.execute("INSERT INTO users (username, password_hash, salt, nickname, signature, avatar_color) VALUES (?, ?, ?, ?, ?, ?)", 
-                           (username, pwd_hash, salt, username, "这个人很懒...", "#3498db"))
-            self.conn.commit()
+            with self.pool.writer() as conn:
+                conn.execute("INSERT INTO users (username, password_hash, salt, nickname, signature, avatar_color) VALUES (?, ?, ?, ?, ?, ?)", 
+                             (username, pwd_hash, salt, username, "这个人很懒...", "#3498db"))
             return True
         except sqlite3.IntegrityError: return False
 
     def get_user_profile(self, username):
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT nickname, signature, avatar_color FROM users WHERE username=?", (username,))
-        res = cursor.fetchone()
+        with self.pool.reader() as conn:
+            res = conn.execute("SELECT nickname, signature, avatar_color FROM users WHERE username=?", (username,)).fetchone()
         if res: return {"nickname": res[0], "signature": res[1], "avatar_color": res[2]}
         return None
 
     def update_user_profile(self, username, nickname, signature, avatar_color):
-        cursor = self.conn.cursor()
-        cursor.execute("UPDATE users SET nickname=?, signature=?, avatar_color=? WHERE username=?", (nickname, signature, avatar_color, username))
-        self.conn.commit()
+        with self.pool.writer() as conn:
+            conn.execute("UPDATE users SET nickname=?, signature=?, avatar_color=? WHERE username=?", (nickname, signature, avatar_color, username))
         return True
 
+    def count_users(self):
+        with self.pool.reader() as conn: return conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def list_usernames(self):
+        # 先取完再逐个产出，不在迭代期间占着读连接
+        with self.pool.reader() as conn: rows = conn.execute("SELECT username FROM users").fetchall()
+        for row in rows: yield row[0]
+
     def get_user_credentials(self, username):
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT password_hash, salt FROM users WHERE username=?", (username,))
-        return cursor.fetchone()
+        with self.pool.reader() as conn:
+            return conn.execute("SELECT password_hash, salt FROM users WHERE username=?", (username,)).fetchone()
 
     def send_friend_request(self, from_user, to_user):
         if from_user == to_user: return False
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT 1 FROM friends WHERE user=? AND friend=?", (from_user, to_user))
-        if cursor.fetchone(): return False 
         try:
-            cursor.execute("INSERT INTO friend_requests (from_user, to_user, status) VALUES (?, ?, 0)", (from_user, to_user))
-            self.conn.commit()
+            with self.pool.writer() as conn:
+                if conn.execute("SELECT 1 FROM friends WHERE user=? AND friend=?", (from_user, to_user)).fetchone(): return False
+                conn.execute("INSERT INTO friend_requests (from_user, to_user, status) VALUES (?, ?, 0)", (from_user, to_user))
             return True
         except: return False
 
     def get_pending_requests(self, user):
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT id, from_user FROM friend_requests WHERE to_user=? AND status=0", (user,))
-        return [{"id": r[0], "from_user": r[1]} for r in cursor.fetchall()]
+        with self.pool.reader() as conn:
+            rows = conn.execute("SELECT id, from_user FROM friend_requests WHERE to_user=? AND status=0", (user,)).fetchall()
+        return [{"id": r[0], "from_user": r[1]} for r in rows]
 
     def handle_request(self, req_id, action, current_user):
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT from_user, to_user FROM friend_requests WHERE id=? AND to_user=?", (req_id, current_user))
-        req = cursor.fetchone()
-        if not req: return False
-        sender, receiver = req
-        if action == 'accept':
-            cursor.execute("INSERT OR IGNORE INTO friends (user, friend) VALUES (?, ?)", (sender, receiver))
-            cursor.execute("INSERT OR IGNORE INTO friends (user, friend) VALUES (?, ?)", (receiver, sender))
-            cursor.execute("UPDATE friend_requests SET status=1 WHERE id=?", (req_id,))
-        else:
-            cursor.execute("UPDATE friend_requests SET status=2 WHERE id=?", (req_id,))
-        self.conn.commit()
+        with self.pool.writer() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT from_user, to_user FROM friend_requests WHERE id=? AND to_user=?", (req_id, current_user))
+            req = cursor.fetchone()
+            if not req: return False
+            sender, receiver = req
+            if action == 'accept':
+                cursor.execute("INSERT OR IGNORE INTO friends (user, friend) VALUES (?, ?)", (sender, receiver))
+                cursor.execute("INSERT OR IGNORE INTO friends (user, friend) VALUES (?, ?)", (receiver, sender))
+                cursor.execute("UPDATE friend_requests SET status=1 WHERE id=?", (req_id,))
+            else:
+                cursor.execute("UPDATE friend_requests SET status=2 WHERE id=?", (req_id,))
         return True
 
     def get_friends(self, user):
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT friend FROM friends WHERE user=?", (user,))
-        return [row[0] for row in cursor.fetchall()]
\ No newline at end of file
+        with self.pool.reader() as conn:
+            return [row[0] for row in conn.execute("SELECT friend FROM friends WHERE user=?", (user,)).fetchall()]
+
+
+def _finish(fut, result, after):
+    try:
+        if after: after()
+    except Exception as e:
+        fut.set_exception(e)
+        return
+    fut.set_result(result)
+
+def _insert_posting(ids, message_id):
+    i = bisect_left(ids, message_id)
+    if i == len(ids) or ids[i] != message_id: ids.insert(i, message_id)
+    return ids
+
+def _blob_from_text(value):
+    try: raw = base64.b64decode(value, validate=True)
+    except ValueError: return None
+    return raw if len(raw) >= 32 and len(raw) % 16 == 0 else None
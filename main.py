@@ -7,7 +7,7 @@ import os
 # 确保能找到当前目录下的模块
 sys.path.append(os.getcwd())
 
-from app import app, socketio
+from app import app, socketio, key_pool, password_hasher
 
 def open_browser():
     """等待 1.5 秒后自动打开浏览器"""
@@ -24,7 +24,11 @@ def main():
     # 1. 启动一个后台线程来打开浏览器
     threading.Thread(target=open_browser, daemon=True).start()
     
-    # 2. 启动 Web 服务器 (SocketIO)
+    # 2. 后台预生成隐私计算用的 Paillier 密钥，并启动密码哈希进程池
+    key_pool.start()
+    password_hasher.start()
+
+    # 3. 启动 Web 服务器 (SocketIO)
     # debug=True 方便调试，但在 main.py 启动时可能会导致浏览器打开两次(这是Flask特性)，
     # 这里设为 False 以保证体验
     print("[SERVER] Web 服务器正在启动...")
@@ -10,9 +10,12 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 root_dir = os.path.dirname(current_dir)
 sys.path.append(root_dir)
 
-from core.paillier import SimplePaillier
-from core.crypto_utils import hash_password, verify_password
-from server.database import DatabaseManager
+from core.paillier import sum_ciphertexts
+from core.crypto_utils import PasswordHasher
+from core.pir import PIRDirectory
+from core.wire import JSONReader, negotiate_codec, decode_public_key, decode_ciphertexts, encode_ciphertexts, encode_ciphertext
+from database import DatabaseManager
+from server.data_store import PostingIndex, MessageStore, check_trapdoors
 
 # 读取配置
 config_path = os.path.join(root_dir, 'config.json')
@@ -20,30 +23,54 @@ with open(config_path, 'r') as f:
     CONFIG = json.load(f)
 
 # 初始化数据库
-db_manager = DatabaseManager(os.path.join(root_dir, CONFIG['db_path']))
+db_manager = DatabaseManager(os.path.join(root_dir, CONFIG['db_path']), sqlite=CONFIG.get('sqlite'), group_commit=CONFIG.get('group_commit'))
 
 online_clients = {} 
-message_store = []  
-search_index = {}   
-salary_data = []    
+message_store = MessageStore()
+search_index = PostingIndex()
+# 每个连接一个线程，PBKDF2 放到进程池里算不占 GIL；并发登录过多时直接回复繁忙
+password_hasher = PasswordHasher(CONFIG.get('password_workers'), CONFIG.get('password_queue_size'))
+BUSY = json.dumps({"status": "FAIL", "msg": "服务器繁忙，请稍后重试"}).encode()
+# 可供 PIR 查询的记录集 {name: PIRDatabase}，"users" 为用户目录位图
+pir_sets = {}
+
+def build_user_directory():
+    pir_sets['users'] = PIRDirectory(db_manager.list_usernames())
+
+def sync_user_directory():
+    # 网页端 (app.py，独立进程) 注册的用户只写进数据库；用户数对不上时按库重建目录。
+    # 并发注册与重建交错时漏掉的用户也会在下一次同步时补上
+    if db_manager.count_users() != pir_sets['users'].count: build_user_directory()
+
+build_user_directory()
 
 def handle_client(conn, addr):
     print(f"[SERVER] Connection from {addr}")
     current_user = None
+    codec = None  # 协商后为 BINARY_CODEC，密文响应改用定宽二进制 + base64url
+    reader = JSONReader(conn)
     
     try:
         while True:
-            msg = conn.recv(8192).decode('utf-8')
-            if not msg: break
+            data = reader.read()
+            if data is None: break
             
-            data = json.loads(msg)
             action = data.get('action')
 
-            if action == 'REGISTER':
+            if action == 'HELLO':
+                codec = negotiate_codec(data.get('codecs'))
+                conn.send(json.dumps({"status": "OK", "codec": codec, "type": "HELLO"}).encode())
+
+            elif action == 'REGISTER':
                 print(f"[SERVER] Processing Register: {data['username']}")
                 # 这里的 password 可能是字符串，hash_password 内部需要处理
-                p_hash, salt = hash_password(data['password'])
+                hashed = password_hasher.hash(data['password'])
+                if hashed is None:
+                    conn.send(BUSY)
+                    continue
+                p_hash, salt = hashed
                 success = db_manager.register_user(data['username'], p_hash, salt)
+                if success and not pir_sets['users'].add(data['username']): build_user_directory()
                 resp = {"status": "OK" if success else "FAIL", "msg": "注册成功" if success else "用户已存在"}
                 conn.send(json.dumps(resp).encode())
                 print(f"[SERVER] Register result sent.")
@@ -52,7 +79,9 @@ def handle_client(conn, addr):
                 uname = data['username']
                 print(f"[SERVER] Processing Login: {uname}")
                 creds = db_manager.get_user_credentials(uname)
-                if creds and verify_password(creds[0], creds[1], data['password']):
+                ok = password_hasher.verify(creds[0], creds[1], data['password']) if creds else False
+                if ok is None: conn.send(BUSY)
+                elif ok:
                     current_user = uname
                     online_clients[current_user] = conn
                     conn.send(json.dumps({"status": "OK", "msg": "登录成功"}).encode())
@@ -75,12 +104,12 @@ def handle_client(conn, addr):
             elif action == 'SEND_MSG':
                 target = data.get('target', 'ALL')
                 cipher = data['cipher_text']
-                msg_id = len(message_store)
-                message_store.append({"sender": current_user, "target": target, "content": cipher})
-                
-                for td in data.get('trapdoors', []):
-                    if td not in search_index: search_index[td] = []
-                    search_index[td].append(msg_id)
+                trapdoors = check_trapdoors(data.get('trapdoors', []))
+                if trapdoors is None:
+                    conn.send(json.dumps({"status": "FAIL", "msg": "无效的陷门"}).encode())
+                    continue
+                msg_id = message_store.append(current_user, target, cipher)
+                search_index.add(msg_id, trapdoors)
 
                 conn.send(json.dumps({"type": "MSG_ACK", "target": target, "content": cipher}).encode())
 
@@ -95,33 +124,56 @@ def handle_client(conn, addr):
                     except: pass
 
             elif action == 'SEARCH':
-                trapdoor = data['trapdoor']
-                matched_ids = search_index.get(trapdoor, [])
-                results = [message_store[mid] for mid in matched_ids]
+                # trapdoors + mode ('and' / 'or')；AND 从最短的倒排表开始求交，遇空即停
+                trapdoors = check_trapdoors(data.get('trapdoors') or [data.get('trapdoor')])
+                if not trapdoors:
+                    conn.send(json.dumps({"status": "FAIL", "msg": "无效的陷门"}).encode())
+                    continue
+                results = [message_store[mid] for mid in search_index.search(trapdoors, data.get('mode', 'and'))]
                 conn.send(json.dumps({"status": "OK", "results": results, "type": "SEARCH_RES"}).encode())
 
+            elif action == 'PIR_INFO':
+                name = data.get('set', 'users')
+                if name == 'users': sync_user_directory()
+                if name not in pir_sets:
+                    conn.send(json.dumps({"status": "FAIL", "msg": "记录集不存在"}).encode())
+                    continue
+                pdb = pir_sets[name]
+                conn.sendall(json.dumps({"status": "OK", "set": name, "rows": pdb.rows, "cols": pdb.cols, "type": "PIR_INFO"}).encode())
+
             elif action == 'PIR_QUERY':
-                q_vec = data['query_vector']
-                pub_key = data['pub_key']
-                if q_vec:
-                    total = q_vec[0]
-                    for i in range(1, len(q_vec)):
-                        total = SimplePaillier.add(pub_key, total, q_vec[i])
-                    conn.send(json.dumps({"status": "OK", "result": total, "type": "PIR_RES"}).encode())
+                # query_vector 为 cols 个加密列选择子，返回每行的同态内积 (rows 个密文)
+                name = data.get('set', 'users')
+                pdb = pir_sets.get(name)
+                pub_key = decode_public_key(data['pub_key'])
+                q_vec = decode_ciphertexts(pub_key, data['query_vector'])
+                if not pdb or len(q_vec) != pdb.cols:
+                    conn.send(json.dumps({"status": "FAIL", "msg": "PIR 参数已变化，请重新获取 PIR_INFO"}).encode())
+                    continue
+                results = pdb.answer(pub_key, q_vec)
+                if codec: results = encode_ciphertexts(pub_key, results)
+                conn.sendall(json.dumps({"status": "OK", "set": name, "cols": pdb.cols, "results": results, "type": "PIR_RES"}).encode())
 
             elif action == 'COMPUTE_SALARY':
-                salary_data.append(data['enc_salary'])
+                # 按上报者公钥累加 (不同公钥的密文不能相乘)，可选按部门/标签分组
+                if not data.get('pub_key'):
+                    conn.send(json.dumps({"status": "FAIL", "msg": "缺少公钥"}).encode())
+                    continue
+                # enc_salaries: 客户端按槽位打包的批量上报，逐槽同态相加，条数由 count 给出
+                pub_key = decode_public_key(data['pub_key'])
+                enc = decode_ciphertexts(pub_key, data.get('enc_salaries') or data['enc_salary'])
+                db_manager.add_salary_record(pub_key, sum_ciphertexts(pub_key, enc), data.get('group'), data.get('count', len(enc)))
                 conn.send(json.dumps({"status": "OK", "msg": "薪资已加密上报"}).encode())
 
             elif action == 'GET_AVG_SALARY':
-                if not salary_data:
+                pub_key = decode_public_key(data['pub_key'])
+                agg = db_manager.get_salary_aggregate(pub_key, data.get('group'))
+                if not agg:
                     conn.send(json.dumps({"status": "FAIL", "msg": "暂无数据"}).encode())
                 else:
-                    pub_key = data['pub_key']
-                    enc_sum = salary_data[0]
-                    for i in range(1, len(salary_data)):
-                        enc_sum = SimplePaillier.add(pub_key, enc_sum, salary_data[i])
-                    conn.send(json.dumps({"status": "OK", "enc_sum": enc_sum, "count": len(salary_data), "type": "SALARY_RES"}).encode())
+                    enc_sum, count = agg
+                    if codec: enc_sum = encode_ciphertext(pub_key, enc_sum)
+                    conn.send(json.dumps({"status": "OK", "enc_sum": enc_sum, "count": count, "group": data.get('group'), "type": "SALARY_RES"}).encode())
 
     except Exception as e:
         # 核心修改：这里会把报错打印出来！
@@ -1,3 +1,9 @@
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from core.sse_utils import merge_postings
+
 # 模拟内存数据库
 class DataStore:
     def __init__(self):
@@ -9,4 +15,78 @@ class DataStore:
         self.users_db = ["Alice", "Bob", "Charlie", "David"] 
 
 # 全局单例
-db = DataStore()
\ No newline at end of file
+db = DataStore()
+
+
+def check_trapdoors(trapdoors):
+    # 陷门来自客户端: 必须是非空字符串组成的列表，否则返回 None，由调用方拒绝该请求
+    if not isinstance(trapdoors, (list, tuple)) or not all(isinstance(td, str) and td for td in trapdoors): return None
+    return list(trapdoors)
+
+
+def trapdoor_key(td):
+    # 64 位十六进制的 SHA-256 / HMAC 陷门存成 32 字节，其它格式原样编码
+    if len(td) == 64:
+        try: return bytes.fromhex(td)
+        except ValueError: pass
+    return td.encode()
+
+
+class PostingIndex:
+    # 倒排索引: 32 字节陷门 -> 递增的消息 id 数组 array('I')，每个出现位置 4 字节。
+    # 消息 id 一般递增，追加即有序；并发写入可能乱序到达，此时二分插入保持有序，求交见 merge_postings
+    def __init__(self):
+        self._lists = {}
+        self._lock = threading.Lock()
+        self.postings = 0
+
+    def add(self, msg_id, trapdoors):
+        with self._lock:
+            for key in {trapdoor_key(td) for td in trapdoors}:
+                plist = self._lists.get(key)
+                if plist is None: plist = self._lists[key] = array('I')
+                if not plist or plist[-1] < msg_id: plist.append(msg_id)
+                else:
+                    i = bisect_left(plist, msg_id)
+                    if plist[i] == msg_id: continue
+                    plist.insert(i, msg_id)
+                self.postings += 1
+
+    def get(self, td):
+        return self._lists.get(trapdoor_key(td), ())
+
+    def search(self, trapdoors, mode='and'):
+        return merge_postings([self.get(td) for td in dict.fromkeys(trapdoors)], mode)
+
+    def __len__(self):
+        return len(self._lists)
+
+    def nbytes(self):
+        return sys.getsizeof(self._lists) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in self._lists.items())
+
+
+def _intern(s):
+    # target 由客户端给出，不一定是字符串；非字符串原样保存，与旧的 list-of-dicts 存储一致
+    return sys.intern(s) if isinstance(s, str) else s
+
+
+class MessageStore:
+    # 列式存储: 每列一个 list，发送者/接收者字符串驻留共享；按下标取出时才组装成 dict
+    def __init__(self):
+        self.senders = []
+        self.targets = []
+        self.contents = []
+        self._lock = threading.Lock()
+
+    def append(self, sender, target, content):
+        with self._lock:
+            self.senders.append(_intern(sender))
+            self.targets.append(_intern(target))
+            self.contents.append(content)
+            return len(self.contents) - 1
+
+    def __getitem__(self, i):
+        return {"sender": self.senders[i], "target": self.targets[i], "content": self.contents[i]}
+
+    def __len__(self):
+        return len(self.contents)
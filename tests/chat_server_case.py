@@ -0,0 +1,52 @@
+import importlib
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from core.wire import JSONReader
+
+
+class ChatServerTestCase(unittest.TestCase):
+    # 经 socketpair 走 chat_server.handle_client 的完整协议；导入 chat_server 时把数据库换成临时目录里的实例，
+    # 不碰仓库中的 server/secure_chat_final.db。每个用例一条新连接，call() 发一个请求并读回一个响应
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.mkdtemp()
+        real = database.DatabaseManager
+        with mock.patch.object(database, 'DatabaseManager', lambda path, **kw: real(os.path.join(cls.folder, 'x.db'), **kw)):
+            sys.modules.pop('server.chat_server', None)
+            cls.server = importlib.import_module('server.chat_server')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.password_hasher.shutdown()
+        cls.server.db_manager.close()
+        sys.modules.pop('server.chat_server', None)
+        shutil.rmtree(cls.folder)
+
+    def setUp(self):
+        self.sock, peer = socket.socketpair()
+        self.sock.settimeout(10)  # 服务端出错后不回包时及时失败，而不是挂住
+        self.handler = threading.Thread(target=self.server.handle_client, args=(peer, ('test', 0)), daemon=True)
+        self.handler.start()
+        self.reader = JSONReader(self.sock)
+
+    def tearDown(self):
+        self.sock.close()
+        self.handler.join(5)
+
+    def call(self, **data):
+        self.sock.sendall(json.dumps(data).encode())
+        try: reply = self.reader.read()
+        except socket.timeout: reply = None
+        self.assertIsNotNone(reply, f"{data['action']}: 服务端未回包")
+        return reply
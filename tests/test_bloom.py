@@ -0,0 +1,26 @@
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.bloom import ScalableBloomFilter
+
+# core.bloom: 增量维护的置位数与序列化往返
+# 运行: python -m unittest discover tests
+
+
+class BloomFilterTest(unittest.TestCase):
+    def test_running_popcount(self):
+        bf = ScalableBloomFilter(64)
+        for i in range(500): bf.add(f"td{i}")
+        self.assertGreater(len(bf.layers), 1)
+        for layer in bf.layers: self.assertEqual(layer.ones, sum(bin(b).count('1') for b in layer.bits))
+        loaded = ScalableBloomFilter.from_bytes(bf.to_bytes())
+        self.assertEqual([layer.ones for layer in loaded.layers], [layer.ones for layer in bf.layers])
+        self.assertEqual(loaded.estimated_fp_rate(), bf.estimated_fp_rate())
+        self.assertTrue(all(f"td{i}" in loaded for i in range(500)))
+
+
+if __name__ == '__main__':
+    unittest.main()
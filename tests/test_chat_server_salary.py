@@ -0,0 +1,38 @@
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.paillier import SimplePaillier
+from chat_server_case import ChatServerTestCase
+
+# chat_server 的 COMPUTE_SALARY / GET_AVG_SALARY 回归检查 (连接与临时数据库见 chat_server_case)
+# 运行: python -m unittest discover tests
+
+
+class SalaryCommandsTest(ChatServerTestCase):
+    def test_compute_and_average(self):
+        self.assertEqual(self.call(action="REGISTER", username="salary_user", password="pw")["status"], "OK")
+        self.assertEqual(self.call(action="LOGIN", username="salary_user", password="pw")["status"], "OK")
+        pub, priv = SimplePaillier().generate_keys(128)
+        salaries = [3000, 4500, 5200]
+        enc = [SimplePaillier.encrypt(pub, s) for s in salaries]
+        self.assertEqual(self.call(action="COMPUTE_SALARY", pub_key=list(pub), enc_salaries=enc[:2], count=2, group="dev")["status"], "OK")
+        self.assertEqual(self.call(action="COMPUTE_SALARY", pub_key=list(pub), enc_salary=enc[2])["status"], "OK")
+
+        total = self.call(action="GET_AVG_SALARY", pub_key=list(pub))
+        self.assertEqual(total["status"], "OK")
+        self.assertEqual(total["count"], 3)
+        self.assertEqual(SimplePaillier.decrypt(priv, pub, int(total["enc_sum"])), sum(salaries))
+
+        dev = self.call(action="GET_AVG_SALARY", pub_key=list(pub), group="dev")
+        self.assertEqual(dev["count"], 2)
+        self.assertEqual(SimplePaillier.decrypt(priv, pub, int(dev["enc_sum"])), sum(salaries[:2]))
+
+        other_pub, _ = SimplePaillier().generate_keys(128)
+        self.assertEqual(self.call(action="GET_AVG_SALARY", pub_key=list(other_pub))["status"], "FAIL")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Crypto.Util import number
+
+from core.paillier import SimplePaillier, PaillierPrivateKey, sum_ciphertexts, multi_exp
+
+# core.paillier: 私钥格式兼容与分块并行归约检查
+# 运行: python -m unittest discover tests
+
+
+class GenericGeneratorTest(unittest.TestCase):
+    def setUp(self):
+        pub, priv = SimplePaillier().generate_keys(128)
+        n = pub[0]
+        n_sq = n * n
+        # g = (1+n)^3 * 12345^n 同样是合法生成元，但不是 n + 1
+        self.pub = (n, pow(1 + n, 3, n_sq) * pow(12345, n, n_sq) % n_sq)
+        lmb = (priv.p - 1) * (priv.q - 1)
+        mu = number.inverse((pow(self.pub[1], lmb, n_sq) - 1) // n, n)
+        self.legacy = (lmb, mu)
+        self.factored = (lmb, mu, priv.p, priv.q)
+
+    def test_load_skips_crt_for_other_g(self):
+        self.assertIsNone(PaillierPrivateKey.load(self.legacy, self.pub))
+        self.assertIsNone(PaillierPrivateKey.load(self.factored, self.pub))
+
+    def test_decrypt_other_g(self):
+        for priv in (self.legacy, self.factored):
+            c = SimplePaillier.encrypt(self.pub, 77)
+            self.assertEqual(SimplePaillier.decrypt(priv, self.pub, c), 77)
+            total = SimplePaillier.add(self.pub, c, SimplePaillier.encrypt(self.pub, 23))
+            self.assertEqual(SimplePaillier.decrypt(priv, self.pub, total), 100)
+
+    def test_n_plus_one_still_uses_crt(self):
+        pub, priv = SimplePaillier().generate_keys(128)
+        self.assertIsInstance(PaillierPrivateKey.load(list(priv)[:2], pub), PaillierPrivateKey)
+        self.assertEqual(SimplePaillier.decrypt(list(priv)[:2], pub, SimplePaillier.encrypt(pub, 77)), 77)
+
+
+class ParallelReduceTest(unittest.TestCase):
+    def test_serial_and_pooled_agree(self):
+        pub, priv = SimplePaillier().generate_keys(128)
+        values = list(range(1, 41))
+        weights = [v % 7 for v in values]
+        enc = [SimplePaillier.encrypt(pub, v) for v in values]
+        for processes in (1, 2):
+            # chunk_size=8 时 processes=2 走进程池分块归约
+            self.assertEqual(SimplePaillier.decrypt(priv, pub, sum_ciphertexts(pub, iter(enc), chunk_size=8, processes=processes)), sum(values))
+            self.assertEqual(SimplePaillier.decrypt(priv, pub, multi_exp(pub, enc, weights, chunk_size=8, processes=processes)),
+                             sum(v * w for v, w in zip(values, weights)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import os
+import sys
+import threading
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.crypto_utils import PasswordHasher, verify_password
+
+# core.crypto_utils.PasswordHasher: 让出等待、关闭后的行为与关闭竞态
+# 运行: python -m unittest discover tests
+
+
+class PasswordHasherTest(unittest.TestCase):
+    def test_hash_with_sleep_backoff(self):
+        sleeps = []
+        hasher = PasswordHasher(1, sleep=sleeps.append).start()
+        try:
+            key, salt = hasher.hash("pw")
+            self.assertTrue(verify_password(key, salt, "pw"))
+            self.assertIs(hasher.verify(key, salt, "pw"), True)
+        finally: hasher.shutdown()
+        # 这里的 sleep 立即返回，轮询次数足够看出退避序列: 2 ms 起倍增，封顶 20 ms
+        self.assertEqual(sleeps[:4], [0.002, 0.004, 0.008, 0.016])
+        self.assertLessEqual(set(sleeps), {0.002, 0.004, 0.008, 0.016, 0.02})
+
+    def test_after_shutdown_is_busy(self):
+        hasher = PasswordHasher(1).start()
+        hasher.shutdown()
+        self.assertIsNone(hasher.hash("pw"))
+        self.assertEqual(hasher.stats()["rejected"], 1)
+
+    def test_shutdown_race(self):
+        hasher = PasswordHasher(2).start()
+        errors, results = [], []
+
+        def worker():
+            try: results.append(hasher.hash("pw"))
+            except Exception as e: errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads: t.start()
+        hasher.shutdown()
+        for t in threads: t.join(30)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results), 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
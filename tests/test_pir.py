@@ -0,0 +1,37 @@
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.paillier import SimplePaillier
+from core.pir import PIRDirectory, build_query, decode_answer, directory_slot, directory_match
+
+# core.pir 用户目录: 查询结果与注册增长时的重建次数
+# 运行: python -m unittest discover tests
+
+
+class PIRDirectoryTest(unittest.TestCase):
+    def test_query(self):
+        pub, priv = SimplePaillier().generate_keys(128)
+        pdb = PIRDirectory(["alice", "bob"])
+        pdb.add("carol")
+        for name, present in (("alice", True), ("carol", True), ("mallory", False)):
+            row, col = divmod(directory_slot(name, pdb.size), pdb.cols)
+            value = decode_answer(priv, pub, pdb.answer(pub, build_query(pub, col, pdb.cols)), row)
+            self.assertEqual(directory_match(value, name), present, name)
+
+    def test_rebuilds_amortized(self):
+        # 用户数从 1 万涨到 4 万: 每次越过负载才按当前人数重建，容量翻倍，只需约 log2(4) 次
+        names = [f"user{i}" for i in range(10000)]
+        pdb, rebuilds = PIRDirectory(names), 0
+        for i in range(10000, 40000):
+            names.append(f"user{i}")
+            if not pdb.add(names[-1]):
+                pdb, rebuilds = PIRDirectory(names), rebuilds + 1
+        self.assertLessEqual(rebuilds, 2)
+        self.assertEqual(pdb.count, len(names))
+
+
+if __name__ == '__main__':
+    unittest.main()
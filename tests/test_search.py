@@ -0,0 +1,177 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+from core.bloom import load_filters
+from chat_server_case import ChatServerTestCase
+
+# 多陷门 AND / OR 加密检索: DatabaseManager.search_encrypted 的倒排缓存与 SQL 两条路径，
+# 以及 chat_server 的 TCP SEARCH。数据库都建在临时目录里
+# 运行: python -m unittest discover tests
+
+A, B, C, MISSING = ('a' * 64, 'b' * 64, 'c' * 64, 'f' * 64)
+# 消息 -> 所含陷门: A 出现 4 次、B 3 次、C 1 次
+DOCS = [{A, B}, {A}, {A, B, C}, {B}, {A}]
+
+
+class _RecordingCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.calls = []
+
+    def execute(self, sql, args=()):
+        self.calls.append((sql, tuple(args)))
+        return self.cursor.execute(sql, args)
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+
+class _SearchCases:
+    cache_bytes = 16 * 1024 * 1024
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.db = database.DatabaseManager(os.path.join(self.folder, 'x.db'), search_cache_bytes=self.cache_bytes, migrate=False)
+        self.ids = [self.db.store_message('room', 'u', b'x', trapdoors=tds) for tds in DOCS]
+        self.db.store_message('other', 'u', b'x', trapdoors={A, B, C})
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.folder)
+
+    def search(self, trapdoors, mode='and', **kw):
+        return [r["id"] for r in self.db.search_encrypted(trapdoors, 'room', mode, **kw)]
+
+    def expected(self, trapdoors, mode):
+        hit = (lambda tds: set(trapdoors) <= tds) if mode == 'and' else (lambda tds: bool(set(trapdoors) & tds))
+        return [mid for mid, tds in zip(self.ids, DOCS) if hit(tds)][::-1]
+
+    def test_and_or(self):
+        for mode in ('and', 'or'):
+            for trapdoors in ([A], [A, B], [B, C], [A, B, C]):
+                self.assertEqual(self.search(trapdoors, mode), self.expected(trapdoors, mode), (mode, trapdoors))
+        # 单个陷门字符串与重复陷门
+        self.assertEqual(self.search(A), self.expected([A], 'and'))
+        self.assertEqual(self.search([A, A, B]), self.expected([A, B], 'and'))
+
+    def test_missing_trapdoor(self):
+        self.assertEqual(self.search([A, MISSING]), [])
+        self.assertEqual(self.search([MISSING], 'or'), [])
+        self.assertEqual(self.search([C, MISSING], 'or'), self.expected([C], 'or'))
+
+    def test_pages(self):
+        for mode in ('and', 'or'):
+            expected, got, before = self.expected([A, B], mode), [], None
+            while True:
+                page = self.db.search_encrypted([A, B], 'room', mode, limit=1, before=before)
+                if not page: break
+                got.extend(r["id"] for r in page)
+                before = (page[-1]["timestamp"], page[-1]["id"])
+            self.assertEqual(got, expected, mode)
+
+    def pages(self, trapdoors, mode, limit, sql_pages=()):
+        # 逐页翻到底；sql_pages 里的页号强制走 _search_sql (模拟中途倒排缓存被淘汰)
+        got, before, i = [], None, 0
+        while True:
+            if i in sql_pages:
+                with mock.patch.object(self.db, 'room_postings', return_value=None):
+                    page = self.db.search_encrypted(trapdoors, 'room', mode, limit=limit, before=before)
+            else: page = self.db.search_encrypted(trapdoors, 'room', mode, limit=limit, before=before)
+            if not page: return got
+            got.extend(r["id"] for r in page)
+            before = (page[-1]["timestamp"], page[-1]["id"])
+            i += 1
+
+    def test_pages_across_timestamp_inversion(self):
+        # 旧数据或时间戳先于 INSERT 取得时，id 顺序与 timestamp 顺序可能相反
+        with self.db.pool.writer() as conn:
+            for mid, ts in zip(self.ids, (50, 10, 40, 20, 30)): conn.execute("UPDATE messages SET timestamp=? WHERE id=?", (ts, mid))
+        for mode in ('and', 'or'):
+            expected = self.expected([A, B], mode)
+            for limit in (1, 2):
+                self.assertEqual(self.pages([A, B], mode, limit), expected, (mode, limit))
+                # 相邻页交替落在倒排缓存与 SQL 两条路径上
+                self.assertEqual(self.pages([A, B], mode, limit, sql_pages=(1, 3)), expected, (mode, limit))
+                self.assertEqual(self.pages([A, B], mode, limit, sql_pages=(0, 2)), expected, (mode, limit))
+
+    def test_sql_drives_from_rarest(self):
+        with self.db.pool.reader() as conn:
+            cursor = _RecordingCursor(conn.cursor())
+            rows = self.db._search_sql_rows(cursor, [A, B, C], 'room', 'and', None, None)
+        self.assertEqual([r[0] for r in rows], self.expected([A, B, C], 'and'))
+        # 最后一条为取消息的查询: 从 C (2 条，计数含 other 房间) 出发，再探测 B (4 条)、A (5 条)
+        args = cursor.calls[-1][1]
+        self.assertEqual((args[0], args[-2:]), (C, (B, A)))
+
+    def test_old_message_index_survives_crash(self):
+        # 给已落盘 high-water 之内的旧消息补陷门: 不等 flush 周期就写入 .bloom，否则崩溃后启动补录不到，永远漏报
+        self.db.flush_blooms()
+        self.db.add_search_index(self.ids[1], [MISSING], room='room')
+        with open(self.db.bloom_path, 'rb') as f: filters, _ = load_filters(f.read())
+        self.assertIn(MISSING, filters['room'])
+        self.assertEqual(self.search(MISSING), [self.ids[1]])
+
+
+class EncryptedSearchSQLTest(_SearchCases, unittest.TestCase):
+    # search_cache_bytes=64 时多于一条的倒排表都过长，search_encrypted 只能走 _search_sql
+    cache_bytes = 64
+
+    def test_uses_sql(self):
+        with mock.patch.object(self.db, '_search_sql', wraps=self.db._search_sql) as sql:
+            self.assertEqual(self.search([A, B]), self.expected([A, B], 'and'))
+        sql.assert_called_once()
+        self.assertEqual(len(self.db.search_cache), 0)
+
+    def test_oversized_list_not_reloaded(self):
+        self.search([A, B], limit=1)
+        self.assertIn(('room', A), self.db.search_oversized)
+        # 之后的查询与翻页不再拉取 search_cache_max_postings + 1 行再丢弃
+        with mock.patch.object(self.db.pool, 'reader', wraps=self.db.pool.reader) as reader:
+            self.assertEqual(self.search([A, B], limit=1), self.expected([A, B], 'and')[:1])
+        reader.assert_called_once()
+
+
+class EncryptedSearchCacheTest(_SearchCases, unittest.TestCase):
+    def test_uses_cache(self):
+        self.search([A, B], 'or')
+        with mock.patch.object(self.db, '_search_sql') as sql:
+            self.assertEqual(self.search([A, B]), self.expected([A, B], 'and'))
+            self.assertEqual(self.search([A, B], 'or'), self.expected([A, B], 'or'))
+        sql.assert_not_called()
+        self.assertIn(('room', A), self.db.search_cache)
+
+
+class ChatServerSearchTest(ChatServerTestCase):
+    def test_search_action(self):
+        self.assertEqual(self.call(action="REGISTER", username="search_user", password="pw")["status"], "OK")
+        self.assertEqual(self.call(action="LOGIN", username="search_user", password="pw")["status"], "OK")
+        for i, tds in enumerate(DOCS):
+            self.assertEqual(self.call(action="SEND_MSG", target="ALL", cipher_text=f"m{i}", trapdoors=sorted(tds))["type"], "MSG_ACK")
+        contents = lambda reply: sorted(r["content"] for r in reply["results"])
+        self.assertEqual(contents(self.call(action="SEARCH", trapdoor=C)), ["m2"])
+        self.assertEqual(contents(self.call(action="SEARCH", trapdoors=[A, B])), ["m0", "m2"])
+        self.assertEqual(contents(self.call(action="SEARCH", trapdoors=[B, C], mode="or")), ["m0", "m2", "m3"])
+        self.assertEqual(self.call(action="SEARCH", trapdoors=[A, MISSING])["results"], [])
+
+    def test_bad_trapdoors_rejected(self):
+        # 非字符串陷门不能让连接线程抛错退出: 请求被拒绝，同一连接之后仍可正常使用
+        self.assertEqual(self.call(action="REGISTER", username="bad_td_user", password="pw")["status"], "OK")
+        self.assertEqual(self.call(action="LOGIN", username="bad_td_user", password="pw")["status"], "OK")
+        for trapdoors in ([1, 2], [None], "a" * 64, [{"x": 1}], [A, 7]):
+            self.assertEqual(self.call(action="SEND_MSG", target="ALL", cipher_text="bad", trapdoors=trapdoors)["status"], "FAIL", trapdoors)
+            self.assertEqual(self.call(action="SEARCH", trapdoors=trapdoors)["status"], "FAIL", trapdoors)
+        self.assertEqual(self.call(action="SEARCH", trapdoor=12)["status"], "FAIL")
+        self.assertEqual(self.call(action="SEARCH")["status"], "FAIL")
+        self.assertEqual(self.call(action="SEND_MSG", target=5, cipher_text="ok", trapdoors=[MISSING])["type"], "MSG_ACK")
+        self.assertEqual(self.call(action="SEARCH", trapdoors=[MISSING])["results"], [{"sender": "bad_td_user", "target": 5, "content": "ok"}])
+
+
+if __name__ == '__main__':
+    unittest.main()
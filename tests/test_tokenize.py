@@ -0,0 +1,56 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from core.sse_utils import tokenize
+
+# 关键词分词: core/sse_utils.tokenize 与 templates/chat.html 的 tokenize 必须对同一文本给出相同的词，
+# 否则网页端建的索引与桌面端的查询陷门对不上。网页端的实现用 node 直接从模板里取出来跑
+# 运行: python -m unittest discover tests
+
+SAMPLES = [
+    "Hello, World! hello again",
+    "Ｈｅｌｌｏ　ＷＯＲＬＤ ＡＢＣ１２３",
+    "Straße STRASSE ΟΔΟΣ Σίσυφος İstanbul",
+    "école café̀ a_b snake_case x​y",
+    "²³ ① ٣٤ Ⅻ ½ 10km",
+    "今天天气很好，我们去公园吧！",
+    "東京タワー と ソウル 서울타워",
+    "混合mixed文本text123与English",
+    "的 了 是 the and of 我",
+]
+CASES = [
+    ("Hello, World! hello again", False, ["hello", "world", "again"]),
+    ("今天天气", True, ["今天", "天天", "天气"]),
+    ("今天天气", False, ["今", "天", "气", "今天", "天天", "天气"]),
+    ("的是", False, ["的是"]),
+]
+
+
+class TokenizeTest(unittest.TestCase):
+    def test_cases(self):
+        for text, query, expected in CASES:
+            self.assertEqual(tokenize(text, query=query), expected, text)
+
+    def test_matches_browser(self):
+        node = shutil.which('node')
+        if node is None: self.skipTest("需要 node 运行 chat.html 中的分词函数")
+        with open(os.path.join(ROOT, 'templates', 'chat.html'), encoding='utf-8') as f: html = f.read()
+        source = re.search(r"(    const CJK = .*?\n    }\n)", html, re.S).group(1)
+        script = source + "const samples = JSON.parse(require('fs').readFileSync(0, 'utf8'));\n" \
+            "console.log(JSON.stringify(samples.map(([t, q]) => tokenize(t, q))));\n"
+        samples = [[text, query] for text in SAMPLES + [c[0] for c in CASES] for query in (False, True)]
+        out = subprocess.run([node, '-e', script], input=json.dumps(samples), capture_output=True, text=True, check=True).stdout
+        for (text, query), tokens in zip(samples, json.loads(out)):
+            self.assertEqual(tokens, tokenize(text, query=query), (text, query))
+
+
+if __name__ == '__main__':
+    unittest.main()
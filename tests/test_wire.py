@@ -0,0 +1,51 @@
+import json
+import os
+import socket
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.wire import JSONReader
+
+# core.wire.JSONReader 的分帧检查: 半截文档要等后续数据，坏文档要立即报错并跳过
+# 运行: python -m unittest discover tests
+
+
+class JSONReaderTest(unittest.TestCase):
+    def setUp(self):
+        self.sock, self.peer = socket.socketpair()
+        self.sock.settimeout(2)
+        self.reader = JSONReader(self.sock)
+
+    def tearDown(self):
+        self.sock.close()
+        self.peer.close()
+
+    def test_split_and_coalesced(self):
+        self.sock.settimeout(0.2)
+        cases = ((('{"action": "GE', 'T_FRIENDS"}'), {"action": "GET_FRIENDS"}), (('{"a": tr', 'ue}'), {"a": True}),
+                 (('{"a": 1.', '5e-', '3}'), {"a": 1.5e-3}), (('{"a": "\\u4e', '2d"}'), {"a": "中"}),
+                 (('{"a": -', 'Infinity}'), {"a": float('-inf')}))
+        for parts, expected in cases:
+            for part in parts[:-1]:
+                self.peer.sendall(part.encode())
+                # 半截文档: 继续等数据直到超时，而不是报错
+                with self.assertRaises(socket.timeout): self.reader.read()
+            self.peer.sendall(parts[-1].encode())
+            self.assertEqual(self.reader.read(), expected)
+        self.peer.sendall(b'{"x": 1}{"y": 2}')
+        self.assertEqual([self.reader.read(), self.reader.read()], [{"x": 1}, {"y": 2}])
+
+    def test_corrupt_document_is_skipped(self):
+        self.peer.sendall(b'{"action": }{"action":"GET_FRIENDS"}')
+        with self.assertRaises(json.JSONDecodeError): self.reader.read()
+        self.assertEqual(self.reader.read(), {"action": "GET_FRIENDS"})
+        self.peer.sendall(b'{"a": "x\n"}')
+        with self.assertRaises(json.JSONDecodeError): self.reader.read()
+        self.peer.close()
+        self.assertIsNone(self.reader.read())
+
+
+if __name__ == '__main__':
+    unittest.main()